@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Google Sheets export benchmark
+------------------------------
+Runs export_subscriptions() against an in-memory fake worksheet: a first
+full export, an export with a share of users changed, added and deleted, and
+a no-op export. Reports API calls, written cells and wall time per phase and
+checks that the sheet matches the users table afterwards.
+
+Usage:
+    python benchmarks/bench_sheets_export.py --size 20000 --change-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.bench_sync import RESULTS_DIR, git_revision, peak_rss_mb
+from benchmarks.fake_sheets import FakeWorksheet
+
+def seed_users(size):
+    from models import User, Session, init_db
+
+    init_db()
+    db_session = Session()
+    try:
+        db_session.bulk_insert_mappings(User, [
+            {'telegram_id': 1000000 + index, 'first_name': f"User {index}", 'subscription_status': 'none'}
+            for index in range(size)
+        ])
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def mutate_users(size, change_rate, seed=42):
+    """Change, add and delete a share of users"""
+    from models import User, Session
+
+    rng = random.Random(seed)
+    changed = rng.sample(range(size), int(size * change_rate))
+    db_session = Session()
+    try:
+        for index in changed:
+            user = db_session.query(User).filter_by(telegram_id=1000000 + index).first()
+            user.subscription_status = 'active'
+            user.subscription_end_date = datetime.now()
+        db_session.bulk_insert_mappings(User, [
+            {'telegram_id': 2000000 + index, 'first_name': f"New {index}", 'subscription_status': 'none'}
+            for index in range(len(changed) // 10)
+        ])
+        db_session.query(User).filter(User.telegram_id.in_(
+            [1000000 + index for index in changed[:len(changed) // 10]]
+        )).delete(synchronize_session=False)
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def sheet_matches_db(worksheet):
+    """Check that every user row in the sheet equals the current DB row"""
+    from models import User, SheetExportRow, Session
+    from modules.sheets_export import user_row
+
+    db_session = Session()
+    try:
+        rows = {row.telegram_id: row.row_number for row in db_session.query(SheetExportRow)}
+        users = db_session.query(User).all()
+        if len(rows) != len(users):
+            return False
+        return all(worksheet.row_values(rows[user.telegram_id]) == user_row(user) for user in users)
+    finally:
+        db_session.close()
+
+def measure(name, worksheet, chunk_size):
+    from modules.sheets_export import export_subscriptions
+
+    calls_before, cells_before = worksheet.api_calls, worksheet.cells_written
+    started = time.perf_counter()
+    stats = export_subscriptions(worksheet, chunk_size=chunk_size)
+    return {
+        'phase': name,
+        'wall_time_s': round(time.perf_counter() - started, 4),
+        'api_calls': worksheet.api_calls - calls_before,
+        'cells_written': worksheet.cells_written - cells_before,
+        'export_stats': stats
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=10000, help='Number of users')
+    parser.add_argument('--change-rate', type=float, default=0.05, help='Share of users changed between exports')
+    parser.add_argument('--chunk-size', type=int, default=500, help='Rows per batch_update call')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/sheets-<size>-<time>.json)')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_sheets_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp_dir, 'sheets.db')}"
+
+    seed_users(args.size)
+    worksheet = FakeWorksheet(max_rows_per_call=args.chunk_size)
+
+    phases = [measure('initial_export', worksheet, args.chunk_size)]
+    mutate_users(args.size, args.change_rate)
+    phases.append(measure('incremental_export', worksheet, args.chunk_size))
+    phases.append(measure('noop_export', worksheet, args.chunk_size))
+    consistent = sheet_matches_db(worksheet)
+
+    results = {
+        'benchmark': 'sheets_export',
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': vars(args),
+        'phases': phases,
+        'sheet_matches_db': consistent,
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"sheets-{args.size}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for phase in phases:
+        print(f"{phase['phase']}: {phase['wall_time_s']}s, {phase['api_calls']} API calls, "
+              f"{phase['cells_written']} cells written")
+    print(f"Sheet matches DB: {consistent}")
+    print(f"Results written to {output}")
+    if not consistent:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
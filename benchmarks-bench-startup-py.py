@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Startup time benchmark
+----------------------
+Measures, in fresh interpreter processes, the time from the first import to
+the first update handled: importing bot.py, building the Application,
+initializing it against a fake Bot API and processing one /start update.
+Also lists the slowest imports reported by `python -X importtime`.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+async def first_update(timings):
+    started = time.perf_counter()
+    from bot import build_application
+    timings['import_bot_s'] = time.perf_counter() - started
+
+    from telegram import Update
+    from telegram.ext import Application
+    from benchmarks.fake_telegram import RecordingRequest, UpdateFactory
+
+    started = time.perf_counter()
+    builder = Application.builder().token(os.environ['BOT_TOKEN']).request(RecordingRequest()).get_updates_request(RecordingRequest())
+    application = build_application(builder)
+    timings['build_application_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await application.initialize()
+    timings['initialize_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    update = Update.de_json(UpdateFactory(-1).command(1000000, '/start'), application.bot)
+    await application.process_update(update)
+    timings['first_update_s'] = time.perf_counter() - started
+
+    timings['total_s'] = time.perf_counter() - PROCESS_STARTED
+    await application.shutdown()
+
+def run_child():
+    """Measure one cold start and print the timings as JSON"""
+    timings = {}
+    asyncio.run(first_update(timings))
+    print(json.dumps(timings))
+
+def slowest_imports(env, limit):
+    """Return the slowest cumulative imports of bot.py"""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import bot'],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True
+    ).stderr
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # Format: "import time: <self us> | <cumulative us> | <indented module name>"
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        imports.append({'module': name.strip(), 'cumulative_ms': int(cumulative_us) / 1000})
+    imports.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+    return imports[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Number of cold starts to measure')
+    parser.add_argument('--top-imports', type=int, default=15, help='Number of slowest imports to report')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/startup-<time>.json)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child()
+        return
+
+    from benchmarks.bench_sync import git_revision
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp_dir, 'startup.db')}",
+        'BOT_TOKEN': '123456:STARTUP',
+        'PYTHONPATH': ROOT_DIR
+    })
+    # Schema creation is a separate migration step and is not part of the measured startup
+    subprocess.run([sys.executable, '-c', 'from models import init_db; init_db()'], cwd=ROOT_DIR, env=env, check=True)
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child'],
+            cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = {key: round(statistics.median(run[key] for run in runs), 4) for key in runs[0]}
+    results = {
+        'benchmark': 'startup',
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': {'runs': args.runs},
+        'median': summary,
+        'runs': runs,
+        'slowest_imports': slowest_imports(env, args.top_imports)
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(', '.join(f"{key} {value}s" for key, value in summary.items()))
+    for item in results['slowest_imports']:
+        print(f"  {item['cumulative_ms']:8.1f} ms  {item['module']}")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
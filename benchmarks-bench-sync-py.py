@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Subscription sync benchmark
+---------------------------
+Runs sync_subscriptions() and verify_subscription_by_email() against local
+Wix/Ainox stand-ins and a temporary SQLite database, then stores wall time,
+HTTP call count, DB query count and peak RSS as JSON.
+
+Usage:
+    python benchmarks/bench_sync.py --size 1000 --latency 0.005
+    python benchmarks/bench_sync.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fake_providers import start_fake_providers, make_email
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+def configure_environment(db_path, wix, ainox):
+    """Point config at the temporary DB and the fake providers before the bot modules are imported"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['WIX_API_URL'] = wix.url
+    os.environ['AINOX_URL'] = ainox.url + '/'
+
+def seed_users(dataset_size):
+    """Create the schema and one linked user per synthetic subscriber"""
+    from models import User, Session, init_db
+
+    init_db()
+    db_session = Session()
+    try:
+        db_session.bulk_insert_mappings(User, [
+            {
+                'telegram_id': 1000000 + index,
+                'first_name': f"User {index}",
+                'subscription_status': 'none',
+                'email': make_email(index)
+            }
+            for index in range(dataset_size)
+        ])
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def count_queries(engine):
+    """Attach a query counter to the engine and return it"""
+    from sqlalchemy import event
+
+    counter = {'queries': 0}
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    return counter
+
+def peak_rss_mb():
+    """Return peak resident set size of this process in MB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return rss / (1024 * 1024)
+    return rss / 1024
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def measure(name, func, wix, ainox, counter):
+    """Run one benchmark phase and collect its numbers"""
+    queries_before = counter['queries']
+    wix.calls.clear()
+    ainox.calls.clear()
+
+    started = time.perf_counter()
+    result = func()
+    wall_time = time.perf_counter() - started
+
+    return {
+        'phase': name,
+        'wall_time_s': round(wall_time, 4),
+        'http_calls': wix.total_calls + ainox.total_calls,
+        'http_calls_by_endpoint': dict(wix.calls + ainox.calls),
+        'db_queries': counter['queries'] - queries_before,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'result': result
+    }
+
+def run_benchmark(args):
+    wix, ainox = start_fake_providers(args.size, latency=args.latency, error_rate=args.error_rate)
+    tmp_dir = tempfile.mkdtemp(prefix='bench_sync_')
+    configure_environment(os.path.join(tmp_dir, 'bench.db'), wix, ainox)
+
+    from models import engine
+    from modules.payment_integration import sync_subscriptions, verify_subscription_by_email
+
+    seed_users(args.size)
+    counter = count_queries(engine)
+
+    phases = [measure('sync_subscriptions', lambda: asyncio.run(sync_subscriptions()), wix, ainox, counter)]
+
+    async def verify_sample():
+        found = 0
+        for index in range(min(args.verify_samples, args.size)):
+            try:
+                is_subscribed, _ = await verify_subscription_by_email(make_email(index))
+            except Exception:
+                is_subscribed = False
+            found += int(is_subscribed)
+        return {'verified': min(args.verify_samples, args.size), 'found': found}
+
+    phases.append(measure('verify_subscription_by_email', lambda: asyncio.run(verify_sample()), wix, ainox, counter))
+
+    wix.stop()
+    ainox.stop()
+
+    return {
+        'benchmark': 'sync',
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': {
+            'size': args.size,
+            'latency_s': args.latency,
+            'error_rate': args.error_rate,
+            'verify_samples': args.verify_samples
+        },
+        'phases': phases
+    }
+
+def compare(old_path, new_path):
+    """Print per-phase deltas between two result files"""
+    with open(old_path) as f:
+        old = {p['phase']: p for p in json.load(f)['phases']}
+    with open(new_path) as f:
+        new = {p['phase']: p for p in json.load(f)['phases']}
+
+    for phase, new_phase in new.items():
+        old_phase = old.get(phase)
+        if not old_phase:
+            continue
+        print(phase)
+        for key in ('wall_time_s', 'http_calls', 'db_queries', 'peak_rss_mb'):
+            before, after = old_phase[key], new_phase[key]
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"  {key}: {before} -> {after} ({change})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='Number of subscribers (e.g. 1000, 10000, 100000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake provider latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake provider requests answered with HTTP 500')
+    parser.add_argument('--verify-samples', type=int, default=20, help='Number of emails checked with verify_subscription_by_email')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/sync-<size>-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run_benchmark(args)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"sync-{args.size}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for phase in results['phases']:
+        print(f"{phase['phase']}: {phase['wall_time_s']}s, {phase['http_calls']} HTTP calls, "
+              f"{phase['db_queries']} DB queries, peak RSS {phase['peak_rss_mb']} MB")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Local stand-ins for the Wix and Ainox HTTP APIs
+
+Used by the benchmark and load-test scripts. Each fake serves a synthetic
+dataset with configurable latency and error rate and counts every call.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+def make_email(index):
+    """Return the synthetic email used for user number `index`"""
+    return f"user{index}@example.com"
+
+class FakeProviderServer:
+    """Base class for a fake provider running on a local port in a background thread"""
+    def __init__(self, latency=0.0, error_rate=0.0, seed=42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def start(self):
+        """Start serving on a free local port"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake._dispatch(self, 'GET')
+
+            def do_POST(self):
+                fake._dispatch(self, 'POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _dispatch(self, request, method):
+        path = urlparse(request.path).path
+        body = None
+        if method == 'POST':
+            length = int(request.headers.get('Content-Length', 0))
+            body = json.loads(request.rfile.read(length) or b'{}')
+
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+
+        if fail:
+            status, payload = 500, {'error': 'injected failure'}
+        else:
+            status, payload = self.handle(method, path, body)
+
+        with self._lock:
+            self.calls[f"{method} {self.endpoint_name(path, body)} {status}"] += 1
+
+        data = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def endpoint_name(self, path, body):
+        return path
+
+    def handle(self, method, path, body):
+        """Answer a request with (status, JSON payload); subclasses serve their endpoints"""
+        return 404, {'message': 'not found'}
+
+class FakeWixServer(FakeProviderServer):
+    """Fake Wix pricing-plans orders and contacts APIs"""
+    def __init__(self, user_indexes, **kwargs):
+        super().__init__(**kwargs)
+        now = datetime.now()
+        self.orders = []
+        self.contacts = {}
+        for index in user_indexes:
+            contact_id = f"contact-{index}"
+            self.contacts[contact_id] = make_email(index)
+            self.orders.append({
+                'id': f"order-{index}",
+                'planName': 'Online',
+                'status': 'ACTIVE',
+                'buyer': {'contactId': contact_id},
+                'startDate': now.replace(day=1).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'createdDate': now.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'updatedDate': now.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            })
+
+    def endpoint_name(self, path, body):
+        if path.startswith('/contacts/v4/contacts/'):
+            return '/contacts/v4/contacts/{id}'
+        return path
+
+    def handle(self, method, path, body):
+        if method == 'GET' and path == '/pricing-plans/v2/orders':
+            return 200, {'orders': self.orders}
+        if method == 'GET' and path.startswith('/contacts/v4/contacts/'):
+            contact_id = path.rsplit('/', 1)[-1]
+            email = self.contacts.get(contact_id)
+            if email is None:
+                return 404, {'message': 'contact not found'}
+            return 200, {'contact': {'id': contact_id, 'primaryEmail': {'email': email}}}
+        return 404, {'message': 'not found'}
+
+class FakeAinoxServer(FakeProviderServer):
+    """Fake Ainox API answering `subscriber` and `request` queries"""
+    def __init__(self, user_indexes, **kwargs):
+        super().__init__(**kwargs)
+        next_payment = (datetime.now() + timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        self.subscribers = []
+        for index in user_indexes:
+            self.subscribers.append({
+                'id': 100000 + index,
+                'email': make_email(index),
+                'status': 1,
+                'next_payment_date': next_payment,
+                'next_payment_price': 1000,
+                'price': 1000,
+                'first_invoice_id': 500000 + index
+            })
+
+    def endpoint_name(self, path, body):
+        return (body or {}).get('request', path)
+
+    def handle(self, method, path, body):
+        if method != 'POST' or not body:
+            return 404, {'message': 'not found'}
+        if body.get('request') == 'subscriber':
+            subscribers = self.subscribers
+            email = (body.get('filter') or {}).get('email')
+            if email:
+                subscribers = [s for s in subscribers if s['email'] == email]
+            fields = body.get('fields')
+            if fields:
+                subscribers = [{k: s[k] for k in fields if k in s} for s in subscribers]
+            return 200, {'data': subscribers}
+        if body.get('request') == 'request':
+            return 200, {'data': {'id': body.get('id'), 'name': 'Test User', 'phone': '+70000000000'}}
+        return 400, {'message': 'unknown request'}
+
+def start_fake_providers(dataset_size, latency=0.0, error_rate=0.0):
+    """
+    Start a Wix and an Ainox fake sharing one synthetic user base
+
+    Even user indexes pay through Wix, odd ones through Ainox.
+
+    Returns:
+        tuple: (FakeWixServer, FakeAinoxServer)
+    """
+    wix = FakeWixServer(range(0, dataset_size, 2), latency=latency, error_rate=error_rate).start()
+    ainox = FakeAinoxServer(range(1, dataset_size, 2), latency=latency, error_rate=error_rate).start()
+    return wix, ainox
@@ -0,0 +1,73 @@
+"""
+In-memory stand-in for a gspread Worksheet
+
+Implements the subset used by modules.sheets_export (row_count, add_rows,
+batch_update, batch_clear) and counts API calls and written cells, so exports can be
+checked and measured without Google credentials.
+"""
+
+import re
+
+RANGE_PATTERN = re.compile(r'^([A-Z]+)(\d+):([A-Z]+)(\d+)$')
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index
+
+class FakeWorksheet:
+    """Worksheet keeping cell values in a dict keyed by (row, column)"""
+    def __init__(self, rows=1000, cols=26, max_rows_per_call=None):
+        self.row_count = rows
+        self.col_count = cols
+        self.max_rows_per_call = max_rows_per_call
+        self.cells = {}
+        self.api_calls = 0
+        self.cells_written = 0
+
+    def add_rows(self, rows):
+        self.api_calls += 1
+        self.row_count += rows
+
+    def batch_update(self, data, **kwargs):
+        self.api_calls += 1
+        if self.max_rows_per_call and len(data) > self.max_rows_per_call:
+            raise ValueError(f"batch_update with {len(data)} ranges exceeds the fake quota")
+
+        for item in data:
+            match = RANGE_PATTERN.match(item['range'])
+            if not match:
+                raise ValueError(f"Unsupported range: {item['range']}")
+            first_col, first_row = _column_index(match.group(1)), int(match.group(2))
+            if int(match.group(4)) > self.row_count:
+                raise ValueError(f"Range {item['range']} exceeds grid limits ({self.row_count} rows)")
+            for row_offset, values in enumerate(item['values']):
+                for col_offset, value in enumerate(values):
+                    self.cells[(first_row + row_offset, first_col + col_offset)] = value
+                    self.cells_written += 1
+        return {'totalUpdatedCells': self.cells_written}
+
+    def batch_clear(self, ranges):
+        self.api_calls += 1
+        for cell_range in ranges:
+            match = RANGE_PATTERN.match(cell_range)
+            if not match:
+                raise ValueError(f"Unsupported range: {cell_range}")
+            first_col, first_row = _column_index(match.group(1)), int(match.group(2))
+            last_col, last_row = _column_index(match.group(3)), int(match.group(4))
+            for row, col in list(self.cells):
+                if first_row <= row <= last_row and first_col <= col <= last_col:
+                    del self.cells[(row, col)]
+        return {}
+
+    def row_values(self, row):
+        """Return the non-empty prefix of a row, like gspread does"""
+        values = [self.cells.get((row, col), '') for col in range(1, self.col_count + 1)]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def get_all_values(self):
+        last_row = max((row for row, _ in self.cells), default=0)
+        return [self.row_values(row) for row in range(1, last_row + 1)]
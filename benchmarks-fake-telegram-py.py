@@ -0,0 +1,148 @@
+"""
+Fake Telegram Bot API for load testing
+
+RecordingRequest plugs into ApplicationBuilder.request() and answers every Bot
+API call locally while recording it. The update factories build synthetic
+`Update` payloads that go through the real handler graph.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT_ID = 1
+
+BOT_USER = {
+    'id': BOT_ID,
+    'is_bot': True,
+    'first_name': 'Bench',
+    'username': 'bench_bot',
+    'can_join_groups': True,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': False
+}
+
+# Endpoints that return a Message object, all others return True
+MESSAGE_ENDPOINTS = {'sendMessage', 'editMessageText', 'editMessageReplyMarkup'}
+
+class RecordingRequest(BaseRequest):
+    """BaseRequest that answers Bot API calls locally and records them"""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.counts = Counter()
+        # Text of the last message sent to each chat, to check where a flow ended
+        self.last_text = {}
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        # Required by python-telegram-bot 21+; calls are answered locally, so there is no timeout
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        self.calls.append((time.perf_counter(), endpoint, parameters.get('chat_id')))
+        self.counts[endpoint] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint in MESSAGE_ENDPOINTS:
+            chat_id = parameters.get('chat_id', 0)
+            if endpoint == 'sendMessage':
+                self.last_text[chat_id] = parameters.get('text', '')
+            result = {
+                'message_id': parameters.get('message_id') or next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private' if int(chat_id) > 0 else 'supergroup'},
+                'from': BOT_USER,
+                'text': parameters.get('text', '')
+            }
+        else:
+            result = True
+
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+class UpdateFactory:
+    """Builds synthetic update payloads with unique ids"""
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}", 'language_code': 'ru'}
+
+    def _message(self, user_id, chat, **fields):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': chat,
+            'from': self._user(user_id)
+        }
+        message.update(fields)
+        return message
+
+    def _private_chat(self, user_id):
+        return {'id': user_id, 'type': 'private', 'first_name': f"User {user_id}"}
+
+    def command(self, user_id, text):
+        """Private message starting with a bot command, e.g. '/status'"""
+        command_length = len(text.split()[0])
+        return {
+            'update_id': next(self._update_ids),
+            'message': self._message(
+                user_id, self._private_chat(user_id), text=text,
+                entities=[{'type': 'bot_command', 'offset': 0, 'length': command_length}]
+            )
+        }
+
+    def text(self, user_id, text):
+        """Plain private text message"""
+        return {
+            'update_id': next(self._update_ids),
+            'message': self._message(user_id, self._private_chat(user_id), text=text)
+        }
+
+    def callback(self, user_id, data):
+        """Button press on a bot message in the private chat"""
+        bot_message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': self._private_chat(user_id),
+            'from': BOT_USER,
+            'text': 'menu'
+        }
+        return {
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'message': bot_message,
+                'data': data
+            }
+        }
+
+    def new_chat_member(self, user_id):
+        """Service message about a user joining the group"""
+        group_chat = {'id': self.group_id, 'type': 'supergroup', 'title': 'Bench group'}
+        return {
+            'update_id': next(self._update_ids),
+            'message': self._message(user_id, group_chat, new_chat_members=[self._user(user_id)])
+        }
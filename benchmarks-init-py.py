@@ -0,0 +1 @@
+# This file is intentionally left empty to make the directory a proper Python package
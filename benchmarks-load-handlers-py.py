@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Handler load test
+-----------------
+Feeds synthetic updates (/start, /status, button callbacks, /link_email
+conversations, NEW_CHAT_MEMBERS) into the real Application built by bot.py.
+Bot API calls go to a recording fake, provider calls to the local Wix/Ainox
+stand-ins. Reports p50/p95/p99 handler latency, updates per second and event
+loop lag, optionally while send_reminders or a broadcast runs in parallel.
+
+Usage:
+    python benchmarks/load_handlers.py --users 500 --concurrency 20
+    python benchmarks/load_handlers.py --users 500 --background reminders
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fake_providers import start_fake_providers, make_email
+from benchmarks.bench_sync import RESULTS_DIR, configure_environment, seed_users, git_revision, peak_rss_mb
+
+ADMIN_ID = 999
+GROUP_ID = -1001234567890
+FIRST_USER_ID = 1000000
+
+SCENARIOS = ('start', 'status', 'callback', 'link_email', 'join')
+
+def scenario_for(scenarios, index):
+    """Return the scenario virtual user number `index` runs"""
+    return scenarios[index % len(scenarios)]
+
+def unlink_emails(user_indexes):
+    """Remove the seeded email of users, so /link_email asks for one instead of offering to keep it"""
+    from models import User, Session
+
+    db_session = Session()
+    try:
+        telegram_ids = [FIRST_USER_ID + index for index in user_indexes]
+        db_session.query(User).filter(User.telegram_id.in_(telegram_ids)).update({'email': None}, synchronize_session=False)
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def percentile(values, share):
+    """Return the value at the given share (0..1) of a list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(share * (len(ordered) - 1))))
+    return ordered[index]
+
+def scenario_updates(factory, scenario, user_id, index):
+    """Return the ordered update payloads one virtual user sends"""
+    if scenario == 'start':
+        return [('start', factory.command(user_id, '/start'))]
+    if scenario == 'status':
+        return [('status', factory.command(user_id, '/status'))]
+    if scenario == 'callback':
+        return [('callback', factory.callback(user_id, 'check_subscription'))]
+    if scenario == 'link_email':
+        return [
+            ('link_email', factory.command(user_id, '/link_email')),
+            ('email_input', factory.text(user_id, make_email(index))),
+            ('confirm_email', factory.callback(user_id, 'confirm_email'))
+        ]
+    if scenario == 'join':
+        # Joining members are not in the DB yet, so use ids outside the seeded range
+        return [('join', factory.new_chat_member(user_id + 10000000))]
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+async def probe_loop_lag(stop_event, lags, interval=0.01):
+    """Measure how late the event loop wakes up a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run_load(args):
+    from telegram import Update
+    from telegram.ext import Application, CallbackContext
+    from benchmarks.fake_telegram import RecordingRequest, UpdateFactory
+    from bot import build_application
+    from config import MESSAGES
+    from modules.handlers import send_reminders
+
+    fake_request = RecordingRequest(latency=args.bot_latency)
+    builder = (
+        Application.builder()
+        .token(os.environ['BOT_TOKEN'])
+        .request(fake_request)
+        .get_updates_request(RecordingRequest())
+    )
+    application = build_application(builder)
+    await application.initialize()
+
+    factory = UpdateFactory(GROUP_ID)
+    scenarios = args.scenarios.split(',')
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(index):
+        user_id = FIRST_USER_ID + index
+        scenario = scenario_for(scenarios, index)
+        async with semaphore:
+            for kind, payload in scenario_updates(factory, scenario, user_id, index):
+                update = Update.de_json(payload, application.bot)
+                started = time.perf_counter()
+                await application.process_update(update)
+                latencies[kind].append(time.perf_counter() - started)
+        
+        # Every fake subscriber is active, so a completed link ends with the subscription found
+        if scenario == 'link_email':
+            reply = fake_request.last_text.get(user_id, '')
+            expected = f"{MESSAGES['email_linked']}\n\nНайдена активная подписка"
+            assert reply.startswith(expected), f"link_email for user {user_id} ended with: {reply!r}"
+
+    background_task = None
+    if args.background == 'reminders':
+        background_task = asyncio.create_task(send_reminders(CallbackContext(application)))
+    elif args.background == 'broadcast':
+        broadcast = Update.de_json(factory.command(ADMIN_ID, '/broadcast Нагрузочный тест'), application.bot)
+        background_task = asyncio.create_task(application.process_update(broadcast))
+
+    stop_probe = asyncio.Event()
+    loop_lags = []
+    probe_task = asyncio.create_task(probe_loop_lag(stop_probe, loop_lags))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(index) for index in range(args.users)))
+    wall_time = time.perf_counter() - started
+
+    stop_probe.set()
+    await probe_task
+    background_time = None
+    if background_task:
+        await background_task
+        background_time = round(time.perf_counter() - started, 4)
+
+    await application.shutdown()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    handlers = {
+        kind: {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            'max_ms': round(max(values) * 1000, 2)
+        }
+        for kind, values in sorted(latencies.items())
+    }
+
+    return {
+        'wall_time_s': round(wall_time, 4),
+        'updates': len(all_latencies),
+        'updates_per_second': round(len(all_latencies) / wall_time, 1) if wall_time else 0,
+        'p50_ms': round(percentile(all_latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(all_latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 2),
+        'handlers': handlers,
+        'loop_lag_p99_ms': round(percentile(loop_lags, 0.99) * 1000, 2),
+        'loop_lag_max_ms': round(max(loop_lags, default=0) * 1000, 2),
+        'background_done_s': background_time,
+        'bot_api_calls': dict(fake_request.counts),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='Number of virtual users')
+    parser.add_argument('--concurrency', type=int, default=10, help='Virtual users running at the same time')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument('--background', choices=('none', 'reminders', 'broadcast'), default='none',
+                        help='Bulk job to run while the load is applied')
+    parser.add_argument('--bot-latency', type=float, default=0.0, help='Simulated Bot API latency per call in seconds')
+    parser.add_argument('--provider-latency', type=float, default=0.0, help='Fake Wix/Ainox latency per request in seconds')
+    parser.add_argument('--output', help='Result JSON path (default: benchmarks/results/load-<time>.json)')
+    args = parser.parse_args()
+
+    wix, ainox = start_fake_providers(args.users, latency=args.provider_latency)
+    tmp_dir = tempfile.mkdtemp(prefix='load_handlers_')
+    configure_environment(os.path.join(tmp_dir, 'load.db'), wix, ainox)
+    os.environ['BOT_TOKEN'] = '123456:LOADTEST'
+    os.environ['ADMIN_IDS'] = str(ADMIN_ID)
+    os.environ['GROUP_ID'] = str(GROUP_ID)
+
+    seed_users(args.users)
+    scenarios = args.scenarios.split(',')
+    unlink_emails([index for index in range(args.users) if scenario_for(scenarios, index) == 'link_email'])
+    results = asyncio.run(run_load(args))
+    wix.stop()
+    ainox.stop()
+
+    results = {
+        'benchmark': 'load_handlers',
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'params': vars(args),
+        'results': results
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    summary = results['results']
+    print(f"{summary['updates']} updates in {summary['wall_time_s']}s ({summary['updates_per_second']}/s), "
+          f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, "
+          f"loop lag p99 {summary['loop_lag_p99_ms']} ms")
+    for kind, stats in summary['handlers'].items():
+        print(f"  {kind}: n={stats['count']} p50={stats['p50_ms']} p95={stats['p95_ms']} p99={stats['p99_ms']} ms")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,11 @@ This bot handles subscription management, payment verification,
 and automatic reminders for subscription renewal.
 """
 
+import asyncio
 import logging
+import signal
 import sys
+from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler, 
     MessageHandler, filters
@@ -24,29 +27,54 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Import config and handlers
-from config import BOT_TOKEN, MAIN_MENU_KEYBOARD
+from config import (
+    MAIN_MENU_KEYBOARD, METRICS_HOST, METRICS_PORT, QUERY_PROFILING, WORKER_MODE,
+    SYNC_INTERVAL, AUTO_MIGRATE, SHEET_EXPORT_INTERVAL, ENFORCEMENT_ENABLED, ENFORCEMENT_INTERVAL
+)
+from models import engine, Session, init_db
+from modules.metrics import instrument_engine, start_metrics_server
+from modules.query_profiler import enable_query_profiling
 
 # Import handlers from modules
 from modules.handlers import (
     start, help_command, subscribe, check_status, 
     cancel_subscription, button_callback, check_new_members,
     admin_update_subscription, admin_broadcast, 
-    admin_schedule_broadcast, admin_sync_subscriptions,
-    send_reminders, setup_commands_job, schedule_subscription_sync
+    admin_schedule_broadcast, admin_sync_subscriptions, admin_provider_status,
+    admin_db_profile, admin_jobs, admin_export_sheet, admin_stats, admin_enforce,
+    send_reminders, setup_commands_job
 )
 
 # Import email linking handler
 from modules.user_linking import get_email_linking_handler
+from modules.job_store import enqueue_scheduled_job
+from modules.sheets_export import schedule_sheet_export, is_sheet_configured
+from modules.enforcement import schedule_enforcement
+from modules.outbound_queue import PriorityRateLimiter
+from modules.persistence import SQLPersistence
+from modules.sync_coordinator import schedule_subscription_sync
+from modules.tenants import get_tenants, current_tenant, set_current_tenant
 
-def main() -> None:
-    """Start the bot."""
-    # Check if token is provided
-    if BOT_TOKEN == "your_telegram_bot_token":
-        logger.error("Please set your bot token in config.py or .env file")
-        sys.exit(1)
-        
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+def build_application(builder=None, tenant=None, shared_jobs=True) -> Application:
+    """
+    Create the Application and register all handlers and jobs
+
+    Args:
+        builder (ApplicationBuilder): Optional pre-configured builder, e.g. with a fake request
+            for load testing. Defaults to a builder using the tenant's bot token.
+        tenant (Tenant): Tenant served by this application, the current tenant by default
+        shared_jobs (bool): Register the jobs that cover all tenants (provider sync, sheet export);
+            only one application per process should do so
+
+    Returns:
+        Application: Configured application, not yet initialized
+    """
+    tenant = tenant or current_tenant()
+    if builder is None:
+        builder = Application.builder().token(tenant.bot_token)
+    # All Bot API calls go through one queue: interactive replies before bulk sends.
+    # Conversations and user_data are kept in the database across restarts.
+    application = builder.rate_limiter(PriorityRateLimiter()).persistence(SQLPersistence(tenant)).build()
 
     logger.info("Registering command handlers")
     
@@ -62,6 +90,12 @@ def main() -> None:
     application.add_handler(CommandHandler("broadcast", admin_broadcast))
     application.add_handler(CommandHandler("sync_subscriptions", admin_sync_subscriptions))
     application.add_handler(CommandHandler("schedule_broadcast", admin_schedule_broadcast)) 
+    application.add_handler(CommandHandler("provider_status", admin_provider_status))
+    application.add_handler(CommandHandler("db_profile", admin_db_profile))
+    application.add_handler(CommandHandler("jobs", admin_jobs))
+    application.add_handler(CommandHandler("export_sheet", admin_export_sheet))
+    application.add_handler(CommandHandler("stats", admin_stats))
+    application.add_handler(CommandHandler("enforce", admin_enforce))
     
     # Add email linking handler
     logger.info("Registering email linking handler")
@@ -77,23 +111,100 @@ def main() -> None:
     # Add job queue
     job_queue = application.job_queue
     
-    # Job for sending reminders (run every day)
-    job_queue.run_repeating(send_reminders, interval=86400, first=10)
+    if WORKER_MODE == 'external':
+        # Syncs and reminders run in worker.py, the bot only queues them
+        job_queue.run_repeating(enqueue_scheduled_job, interval=86400, first=10, data='reminders')
+        if shared_jobs:
+            job_queue.run_repeating(enqueue_scheduled_job, interval=SYNC_INTERVAL, first=60, data='sync')
+    else:
+        # Job for sending reminders (run every day)
+        job_queue.run_repeating(send_reminders, interval=86400, first=10)
+        
+        # Job for syncing subscriptions of all tenants: incremental every SYNC_INTERVAL,
+        # full once FULL_SYNC_INTERVAL has passed
+        if shared_jobs:
+            job_queue.run_repeating(schedule_subscription_sync, interval=SYNC_INTERVAL, first=60)
     
-    # Job for syncing subscriptions (run every 12 hours)
-    job_queue.run_repeating(schedule_subscription_sync, interval=43200, first=60)
+    # Mirror the subscription table of every tenant with a sheet into Google Sheets
+    if shared_jobs and SHEET_EXPORT_INTERVAL and any(is_sheet_configured(tenant) for tenant in get_tenants()):
+        if WORKER_MODE == 'external':
+            job_queue.run_repeating(enqueue_scheduled_job, interval=SHEET_EXPORT_INTERVAL, first=300, data='sheet_export')
+        else:
+            job_queue.run_repeating(schedule_sheet_export, interval=SHEET_EXPORT_INTERVAL, first=300)
     
-    # Run the initial subscription sync when bot starts
-    job_queue.run_once(schedule_subscription_sync, when=120)
+    # Remove expired users from the group and restore renewed ones
+    if ENFORCEMENT_ENABLED:
+        if WORKER_MODE == 'external':
+            job_queue.run_repeating(enqueue_scheduled_job, interval=ENFORCEMENT_INTERVAL, first=120, data='enforcement')
+        else:
+            job_queue.run_repeating(schedule_enforcement, interval=ENFORCEMENT_INTERVAL, first=120)
     
     # Set up command menu (run once at startup)
     job_queue.run_once(setup_commands_job, when=5)
     
+    return application
+
+async def run_tenant(tenant, application, stop_event) -> None:
+    """Serve one tenant's bot until stop_event is set."""
+    # Tasks created from here on (updates, jobs, persistence flushes) act on behalf of this tenant
+    set_current_tenant(tenant)
+    async with application:
+        await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await application.start()
+        logger.info(f"Tenant {tenant.id} started")
+        await stop_event.wait()
+        await application.updater.stop()
+        await application.stop()
+    logger.info(f"Tenant {tenant.id} stopped")
+
+async def run_tenants(tenants) -> None:
+    """Serve several bots in one event loop, sharing the DB engine and provider pools."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    # The first application runs the jobs that cover all tenants
+    applications = [
+        build_application(tenant=tenant, shared_jobs=index == 0)
+        for index, tenant in enumerate(tenants)
+    ]
+    await asyncio.gather(*(
+        run_tenant(tenant, application, stop_event)
+        for tenant, application in zip(tenants, applications)
+    ))
+
+def main() -> None:
+    """Start the bot."""
+    tenants = get_tenants()
+    
+    # Check if token is provided
+    if any(tenant.bot_token == "your_telegram_bot_token" for tenant in tenants):
+        logger.error("Please set your bot token in config.py or .env file")
+        sys.exit(1)
+    
+    if AUTO_MIGRATE:
+        init_db()
+    
+    # Expose Prometheus metrics on a local port
+    instrument_engine(engine)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_HOST)
+    
+    # Opt-in per-update query counting and N+1 detection
+    if QUERY_PROFILING:
+        enable_query_profiling(engine, Session)
+    
+    if len(tenants) > 1:
+        logger.info(f"Bot started with subscription integration for {len(tenants)} tenants")
+        asyncio.run(run_tenants(tenants))
+        return
+    
+    application = build_application()
     logger.info("Bot started with subscription integration")
     
     # Run the bot until the user presses Ctrl-C
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == "__main__":
-    from telegram import Update
     main()
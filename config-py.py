@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from telegram import ReplyKeyboardMarkup
 
 # Load environment variables from .env file if it exists
 load_dotenv()
@@ -8,16 +9,26 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN", "your_telegram_bot_token")
 GROUP_ID = int(os.getenv("GROUP_ID", "-1000000000"))  # Your Telegram group ID
 ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_IDS", "0").split(",")]  # Admin Telegram IDs
+# JSON file listing several bots/groups served by one process (see modules/tenants.py);
+# when unset, the single tenant above is used
+TENANTS_FILE = os.getenv("TENANTS_FILE", "")
 
 # Ainox API setup
-AINOX_URL = 'https://go.ainox.pro/api/'
+AINOX_URL = os.getenv("AINOX_URL", "https://go.ainox.pro/api/")
 AINOX_LOGIN = os.getenv("AINOX_LOGIN", "your_ainox_login")
 AINOX_KEY = os.getenv("AINOX_KEY", "your_ainox_key")
 
 # Wix API setup
+WIX_API_URL = os.getenv("WIX_API_URL", "https://www.wixapis.com")
 WIX_API_KEY = os.getenv("WIX_API_KEY", "your_wix_api_key")
 WIX_SITE_ID = os.getenv("WIX_SITE_ID", "your_wix_site_id")
 
+# Provider client settings (timeouts in seconds, breaker reset in seconds)
+WIX_TIMEOUT = float(os.getenv("WIX_TIMEOUT", "10"))
+AINOX_TIMEOUT = float(os.getenv("AINOX_TIMEOUT", "10"))
+PROVIDER_FAILURE_THRESHOLD = int(os.getenv("PROVIDER_FAILURE_THRESHOLD", "5"))
+PROVIDER_RESET_TIMEOUT = int(os.getenv("PROVIDER_RESET_TIMEOUT", "60"))
+
 # Payment links
 PAYMENT_LINK_INTERNATIONAL = os.getenv("PAYMENT_LINK_INTERNATIONAL", "your_international_payment_link")
 PAYMENT_LINK_RUSSIAN = os.getenv("PAYMENT_LINK_RUSSIAN", "your_russian_payment_link")
@@ -27,14 +38,69 @@ CANCELLATION_EMAIL = os.getenv("CANCELLATION_EMAIL", "your_cancellation_email")
 # Google API credentials
 CREDENTIALS_PATH = os.getenv("CREDENTIALS_PATH", "credentials.json")
 SHEET_ID = os.getenv("SHEET_ID", "your_google_sheet_id")
+SHEET_EXPORT_INTERVAL = int(os.getenv("SHEET_EXPORT_INTERVAL", "3600"))  # Seconds, 0 disables the scheduled export
+SHEET_EXPORT_CHUNK_SIZE = int(os.getenv("SHEET_EXPORT_CHUNK_SIZE", "500"))  # Rows per batch_update call
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///subscription_bot.db")
+# Run schema migration at startup; disable for fast restarts and run `python migrate.py` on deploy instead
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+
+# Metrics endpoint (disabled when METRICS_PORT is 0)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Separate port for worker.py so it can run next to the bot (disabled when 0)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+# Per-update DB query profiling (opt-in)
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "0") == "1"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Subscription sync cadence in seconds: incremental runs every SYNC_INTERVAL,
+# a full reconciliation at least every FULL_SYNC_INTERVAL
+SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "900"))
+FULL_SYNC_INTERVAL = int(os.getenv("FULL_SYNC_INTERVAL", "86400"))
+# Seconds before a sync lease that is no longer renewed (crashed process) can be taken over;
+# a running sync renews it every SYNC_LEASE_TTL / 3 seconds
+SYNC_LEASE_TTL = int(os.getenv("SYNC_LEASE_TTL", "3600"))
+
+# Background worker: 'inline' runs syncs and reminders in the bot process,
+# 'external' only queues them for worker.py
+WORKER_MODE = os.getenv("WORKER_MODE", "inline")
+WORKER_POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "3600"))  # Seconds before a running job is considered lost
+
+# Seconds between writes of changed conversation states and user_data to the database
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "10"))
+
+# Outbound Bot API queue: global calls per second, per private chat per second,
+# per group per minute, and retries after a flood control (RetryAfter) answer
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "25"))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# Group access enforcement: remove expired users from GROUP_ID and restore them on renewal.
+# ENFORCEMENT_ACTION is 'ban' (remove from the group) or 'restrict' (read-only).
+# With ENFORCEMENT_DRY_RUN=1 scheduled runs only log what they would do.
+ENFORCEMENT_ENABLED = os.getenv("ENFORCEMENT_ENABLED", "0") == "1"
+ENFORCEMENT_DRY_RUN = os.getenv("ENFORCEMENT_DRY_RUN", "1") == "1"
+ENFORCEMENT_ACTION = os.getenv("ENFORCEMENT_ACTION", "ban")
+ENFORCEMENT_INTERVAL = int(os.getenv("ENFORCEMENT_INTERVAL", "3600"))
+ENFORCEMENT_RATE = float(os.getenv("ENFORCEMENT_RATE", "10"))  # Telegram calls per second
+ENFORCEMENT_MAX_ATTEMPTS = int(os.getenv("ENFORCEMENT_MAX_ATTEMPTS", "5"))
 
 # Conversation states
 EMAIL_INPUT = 1
 CONFIRM_EMAIL = 2
 
+# Persistent menu under the input field; buttons send the commands handled in bot.py
+MAIN_MENU_KEYBOARD = ReplyKeyboardMarkup(
+    [["/status", "/subscribe"], ["/link_email", "/cancel"], ["/help"]],
+    resize_keyboard=True
+)
+
 # Messages in Russian - Can be moved to a separate localization file for multi-language support
 MESSAGES = {
     'start': "Привет! Наш цикл с Субагх крийей подошел к концу, с 3 марта стартует новый цикл. Весна - период обновления, лучшее время для реализации новых намерений. Ты с нами?",
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import time
+import traceback
+from datetime import datetime
+
+from sqlalchemy import or_, and_
+
+from models import User, GroupAccess, Session
+from config import ENFORCEMENT_ACTION, ENFORCEMENT_DRY_RUN, ENFORCEMENT_RATE, ENFORCEMENT_MAX_ATTEMPTS
+from modules.metrics import instrument_handler, ENFORCEMENT_ACTIONS, RETRY_AFTER
+from modules.rate_limit import TokenBucket, retry_after_seconds
+from modules.outbound_queue import BULK
+from modules.tenants import current_tenant
+
+logger = logging.getLogger(__name__)
+
+# Coroutines sending actions concurrently; the token bucket sets the actual rate
+ENFORCEMENT_WORKERS = 4
+# Results are written to group_access in batches of this size
+SAVE_BATCH_SIZE = 50
+
+# Telegram answers meaning the user is not in the group, so there is nothing to undo
+NOT_A_MEMBER_ERRORS = ('user not found', 'participant_id_invalid', 'user_not_participant', 'member not found')
+
+def plan_enforcement(db_session, now=None):
+    """
+    Compute the group access actions needed to match subscription statuses
+
+    Expired users that are not removed yet get a 'remove' action, removed users
+    with an active subscription get a 'restore' action. Users without a
+    subscription and admins are left alone, as are actions that already failed
+    ENFORCEMENT_MAX_ATTEMPTS times.
+
+    Args:
+        db_session (Session): Database session
+        now (datetime): Reference time, defaults to the current time
+
+    Returns:
+        list: (telegram_id, action, removal mode) tuples
+    """
+    now = now or datetime.now()
+
+    def not_exhausted(action):
+        return or_(
+            GroupAccess.failed_action.is_(None),
+            GroupAccess.failed_action != action,
+            GroupAccess.attempts < ENFORCEMENT_MAX_ATTEMPTS
+        )
+
+    lapsed = or_(
+        User.subscription_status == 'expired',
+        and_(User.subscription_status == 'active', User.subscription_end_date < now)
+    )
+    to_remove = db_session.query(User.telegram_id).outerjoin(
+        GroupAccess, GroupAccess.telegram_id == User.telegram_id
+    ).filter(
+        lapsed,
+        or_(GroupAccess.state.is_(None), GroupAccess.state != 'removed'),
+        not_exhausted('remove'),
+        User.telegram_id.notin_(current_tenant().admin_ids)
+    )
+
+    to_restore = db_session.query(User.telegram_id, GroupAccess.mode).join(
+        GroupAccess, GroupAccess.telegram_id == User.telegram_id
+    ).filter(
+        GroupAccess.state == 'removed',
+        User.subscription_status == 'active',
+        User.subscription_end_date >= now,
+        not_exhausted('restore')
+    )
+
+    plan = [(telegram_id, 'remove', ENFORCEMENT_ACTION) for telegram_id, in to_remove]
+    plan += [(telegram_id, 'restore', mode or ENFORCEMENT_ACTION) for telegram_id, mode in to_restore]
+    return plan
+
+class EnforcementRun:
+    """Executes one enforcement plan against the Telegram API"""
+    def __init__(self, bot, rate=ENFORCEMENT_RATE):
+        self.bot = bot
+        self.group_id = current_tenant().group_id
+        self.bucket = TokenBucket(rate)
+        self.results = []
+        self.stats = {'applied': 0, 'not_member': 0, 'failed': 0, 'retry_after': 0}
+        self._group_permissions = None
+
+    async def _restored_permissions(self):
+        """Default member permissions of the group, used to lift a restriction"""
+        from telegram import ChatPermissions
+
+        if self._group_permissions is None:
+            chat = await self.bot.get_chat(self.group_id)
+            self._group_permissions = chat.permissions or ChatPermissions.all_permissions()
+        return self._group_permissions
+
+    async def _call(self, telegram_id, action, mode):
+        from telegram import ChatPermissions
+
+        if mode == 'restrict':
+            if action == 'remove':
+                permissions = ChatPermissions.no_permissions()
+            else:
+                permissions = await self._restored_permissions()
+            await self.bot.restrict_chat_member(self.group_id, telegram_id, permissions, rate_limit_args=BULK)
+        elif action == 'remove':
+            await self.bot.ban_chat_member(self.group_id, telegram_id, rate_limit_args=BULK)
+        else:
+            await self.bot.unban_chat_member(self.group_id, telegram_id, only_if_banned=True, rate_limit_args=BULK)
+
+    async def apply(self, telegram_id, action, mode):
+        """Apply one action, waiting out flood control and retrying network errors"""
+        from telegram.error import RetryAfter, BadRequest, Forbidden, TelegramError
+
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self._call(telegram_id, action, mode)
+                self._record(telegram_id, action, mode, 'applied')
+                return
+            except RetryAfter as e:
+                # Flood control: pause every worker, the action itself did not fail
+                wait = retry_after_seconds(e)
+                logger.warning(f"Flood control during enforcement, pausing for {wait}s")
+                RETRY_AFTER.inc(kind='enforcement')
+                self.stats['retry_after'] += 1
+                self.bucket.pause(wait)
+            except BadRequest as e:
+                if any(marker in str(e).lower() for marker in NOT_A_MEMBER_ERRORS):
+                    self._record(telegram_id, action, mode, 'not_member')
+                else:
+                    # Permanent errors (e.g. missing admin rights) are not retried in this run
+                    self._record(telegram_id, action, mode, 'failed', e)
+                return
+            except Forbidden as e:
+                self._record(telegram_id, action, mode, 'failed', e)
+                return
+            except TelegramError as e:
+                attempt += 1
+                if attempt >= ENFORCEMENT_MAX_ATTEMPTS:
+                    self._record(telegram_id, action, mode, 'failed', e)
+                    return
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    def _record(self, telegram_id, action, mode, result, error=None):
+        ENFORCEMENT_ACTIONS.inc(action=action, result=result)
+        self.stats[result] += 1
+        if error:
+            logger.error(f"Enforcement {action} for user {telegram_id} failed: {error}")
+        self.results.append((telegram_id, action, mode, result, error))
+        if len(self.results) >= SAVE_BATCH_SIZE:
+            self.save()
+
+    def save(self):
+        """Persist the collected results to group_access"""
+        if not self.results:
+            return
+        results, self.results = self.results, []
+
+        db_session = Session()
+        try:
+            telegram_ids = [telegram_id for telegram_id, *_ in results]
+            existing = {
+                row.telegram_id: row
+                for row in db_session.query(GroupAccess).filter(GroupAccess.telegram_id.in_(telegram_ids))
+            }
+            now = datetime.now()
+            for telegram_id, action, mode, result, error in results:
+                row = existing.get(telegram_id)
+                if row is None:
+                    row = GroupAccess(telegram_id=telegram_id, state='allowed', attempts=0)
+                    db_session.add(row)
+                    existing[telegram_id] = row
+
+                if result == 'failed':
+                    row.attempts = (row.attempts or 0) + 1 if row.failed_action == action else 1
+                    row.failed_action = action
+                    row.last_error = str(error)
+                else:
+                    # A user who is not in the group counts as removed too, so
+                    # they are restored (unbanned) if they renew and rejoin
+                    row.state = 'removed' if action == 'remove' else 'allowed'
+                    row.mode = mode
+                    row.failed_action = None
+                    row.attempts = 0
+                    row.last_error = None
+                row.updated_at = now
+            db_session.commit()
+        finally:
+            db_session.close()
+
+    async def execute(self, plan):
+        queue = asyncio.Queue()
+        for item in plan:
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    telegram_id, action, mode = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    await self.apply(telegram_id, action, mode)
+                except Exception as e:
+                    logger.error(f"Unexpected enforcement error for user {telegram_id}: {e}")
+                    self._record(telegram_id, action, mode, 'failed', e)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(ENFORCEMENT_WORKERS, len(plan)))))
+        finally:
+            self.save()
+
+async def run_enforcement(bot, dry_run=ENFORCEMENT_DRY_RUN):
+    """
+    Bring group access in line with subscription statuses
+
+    Actions go through a token bucket limited to ENFORCEMENT_RATE calls per
+    second. Results are saved to group_access, so an interrupted run only
+    repeats actions that were not recorded, and those are safe to repeat.
+
+    Args:
+        bot (Bot): Bot used for the group calls
+        dry_run (bool): Only compute and log the plan
+
+    Returns:
+        dict: Planned action counts, results and duration
+    """
+    started = time.perf_counter()
+    db_session = Session()
+    try:
+        plan = plan_enforcement(db_session)
+    finally:
+        db_session.close()
+
+    stats = {
+        'dry_run': dry_run,
+        'remove': sum(1 for _, action, _ in plan if action == 'remove'),
+        'restore': sum(1 for _, action, _ in plan if action == 'restore')
+    }
+
+    if dry_run:
+        stats['sample'] = [f"{action} {telegram_id}" for telegram_id, action, _ in plan[:10]]
+        logger.info(f"Enforcement dry run: {stats}")
+        return stats
+
+    if plan:
+        run = EnforcementRun(bot)
+        await run.execute(plan)
+        stats.update(run.stats)
+
+    stats['duration'] = round(time.perf_counter() - started, 2)
+    logger.info(f"Enforcement completed: {stats}")
+    return stats
+
+def format_enforcement_stats(stats):
+    """Format run_enforcement() stats for an admin reply"""
+    lines = [
+        "Пробный запуск (без изменений)." if stats['dry_run'] else "Применение ограничений завершено.",
+        f"Удалить из группы: {stats['remove']}",
+        f"Восстановить доступ: {stats['restore']}"
+    ]
+    if stats['dry_run']:
+        if stats.get('sample'):
+            lines.append("Примеры: " + ", ".join(stats['sample']))
+        return "\n".join(lines)
+
+    lines.append(
+        f"Выполнено: {stats.get('applied', 0)}, не в группе: {stats.get('not_member', 0)}, "
+        f"ошибок: {stats.get('failed', 0)}, ожиданий flood control: {stats.get('retry_after', 0)}, "
+        f"время: {stats['duration']} с"
+    )
+    return "\n".join(lines)
+
+@instrument_handler
+async def schedule_enforcement(context):
+    """Job queue callback for the periodic enforcement run"""
+    try:
+        await run_enforcement(context.bot)
+    except Exception as e:
+        logger.error(f"Enforcement run failed: {e}")
+        logger.error(traceback.format_exc())
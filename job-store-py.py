@@ -0,0 +1,176 @@
+import json
+import logging
+import traceback
+from datetime import datetime, timedelta
+
+from models import Job, Session
+from config import JOB_MAX_ATTEMPTS, JOB_TIMEOUT
+from modules.tenants import get_tenants, current_tenant_id, tenant_scope
+
+logger = logging.getLogger(__name__)
+
+# Job kinds the shared scheduler queues once per tenant
+SHARED_JOB_KINDS = ('sync', 'sheet_export')
+
+def _job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'tenant_id': job.tenant_id,
+        'status': job.status,
+        'payload': json.loads(job.payload) if job.payload else None,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'attempts': job.attempts,
+        'worker_id': job.worker_id,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at
+    }
+
+def enqueue_job(kind, payload=None, dedupe=True):
+    """
+    Add a job to the queue for the current tenant
+
+    Args:
+        kind (str): Job kind, e.g. 'sync' or 'reminders'
+        payload (dict): Optional JSON serializable arguments
+        dedupe (bool): Reuse an already pending job of the same kind and payload instead of adding another
+
+    Returns:
+        int: ID of the queued job
+    """
+    encoded_payload = json.dumps(payload, sort_keys=True) if payload is not None else None
+    db_session = Session()
+    try:
+        if dedupe:
+            pending = db_session.query(Job).filter_by(
+                kind=kind, tenant_id=current_tenant_id(), status='pending', payload=encoded_payload
+            ).first()
+            if pending:
+                return pending.id
+
+        job = Job(kind=kind, payload=encoded_payload)
+        db_session.add(job)
+        db_session.commit()
+        logger.info(f"Queued {kind} job {job.id}")
+        return job.id
+    finally:
+        db_session.close()
+
+def claim_next_job(worker_id, kinds=None):
+    """
+    Atomically take the oldest pending job
+
+    Jobs stuck in 'running' for longer than JOB_TIMEOUT are returned to the queue first.
+
+    Args:
+        worker_id (str): Identifier of the claiming worker
+        kinds (list): Optional list of job kinds this worker handles
+
+    Returns:
+        dict: Claimed job, or None if the queue is empty
+    """
+    db_session = Session()
+    try:
+        now = datetime.now()
+        stale = db_session.query(Job).filter(
+            Job.status == 'running',
+            Job.started_at < now - timedelta(seconds=JOB_TIMEOUT)
+        )
+        for job in stale:
+            logger.warning(f"Job {job.id} timed out on worker {job.worker_id}, returning it to the queue")
+            job.status = 'pending'
+        db_session.commit()
+
+        query = db_session.query(Job.id).filter_by(status='pending')
+        if kinds:
+            query = query.filter(Job.kind.in_(kinds))
+
+        for (job_id,) in query.order_by(Job.created_at, Job.id).limit(5):
+            # Conditional update so two workers can never claim the same job
+            claimed = db_session.query(Job).filter_by(id=job_id, status='pending').update({
+                'status': 'running',
+                'worker_id': worker_id,
+                'started_at': now,
+                'attempts': Job.attempts + 1
+            }, synchronize_session=False)
+            db_session.commit()
+            if claimed:
+                return _job_to_dict(db_session.get(Job, job_id))
+        return None
+    finally:
+        db_session.close()
+
+def complete_job(job_id, result=None):
+    """Mark a job as done and store its JSON serializable result"""
+    db_session = Session()
+    try:
+        job = db_session.get(Job, job_id)
+        job.status = 'done'
+        job.result = json.dumps(result, default=str) if result is not None else None
+        job.error = None
+        job.finished_at = datetime.now()
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def fail_job(job_id, error):
+    """Record a failed attempt and put the job back in the queue until JOB_MAX_ATTEMPTS is reached"""
+    db_session = Session()
+    try:
+        job = db_session.get(Job, job_id)
+        job.error = str(error)
+        if job.attempts < JOB_MAX_ATTEMPTS:
+            job.status = 'pending'
+            logger.warning(f"Job {job_id} failed (attempt {job.attempts}), will retry: {error}")
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.now()
+            logger.error(f"Job {job_id} failed permanently: {error}")
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def get_job(job_id):
+    """Return a job of the current tenant by ID, or None"""
+    db_session = Session()
+    try:
+        job = db_session.query(Job).filter_by(id=job_id, tenant_id=current_tenant_id()).first()
+        return _job_to_dict(job) if job else None
+    finally:
+        db_session.close()
+
+def get_recent_jobs(limit=10):
+    """Return the most recently created jobs of the current tenant"""
+    db_session = Session()
+    try:
+        jobs = db_session.query(Job).filter_by(tenant_id=current_tenant_id()).order_by(Job.id.desc()).limit(limit).all()
+        return [_job_to_dict(job) for job in jobs]
+    finally:
+        db_session.close()
+
+def format_job(job):
+    """Format a job for an admin message"""
+    line = f"#{job['id']} {job['kind']}: {job['status']}, попыток {job['attempts']}"
+    if job['finished_at']:
+        line += f", завершено {job['finished_at'].strftime('%d.%m.%Y %H:%M')}"
+    if job['result']:
+        line += f"\n  результат: {job['result']}"
+    if job['error']:
+        line += f"\n  ошибка: {job['error']}"
+    return line
+
+async def enqueue_scheduled_job(context):
+    """Job queue callback that hands the work to the standalone worker instead of running it"""
+    kind = context.job.data
+    try:
+        if kind in SHARED_JOB_KINDS:
+            for tenant in get_tenants():
+                with tenant_scope(tenant):
+                    enqueue_job(kind)
+        else:
+            enqueue_job(kind)
+    except Exception as e:
+        logger.error(f"Failed to queue {context.job.data} job: {e}")
+        logger.error(traceback.format_exc())
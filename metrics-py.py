@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.query_profiler import profile_unit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class Metric:
+    """Base class for a labelled metric kept in process memory"""
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, labelvalues, extra_label, value) tuples"""
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield '', labelvalues, None, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {value}")
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(Metric):
+    """Histogram with fixed buckets"""
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, dict(state, buckets=list(state['buckets']))) for key, state in self._values.items()]
+        for labelvalues, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['buckets']):
+                cumulative += count
+                yield '_bucket', labelvalues, ('le', bound), cumulative
+            yield '_bucket', labelvalues, ('le', '+Inf'), state['count']
+            yield '_sum', labelvalues, None, state['sum']
+            yield '_count', labelvalues, None, state['count']
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text format"""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+REGISTRY = Registry()
+
+# Handlers
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    'bot_handler_latency_seconds', 'Update handler and job latency', ('handler',)))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'bot_handler_errors_total', 'Unhandled exceptions raised by handlers and jobs', ('handler',)))
+
+# Payment providers
+PROVIDER_REQUESTS = REGISTRY.register(Counter(
+    'provider_requests_total', 'HTTP calls to payment providers', ('provider', 'status')))
+PROVIDER_LATENCY = REGISTRY.register(Histogram(
+    'provider_request_latency_seconds', 'HTTP call latency to payment providers', ('provider', 'status')))
+
+# Subscription sync
+SYNC_DURATION = REGISTRY.register(Histogram(
+    'sync_run_duration_seconds', 'Duration of a subscription sync run, full or incremental',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800)))
+SYNC_MATCHED = REGISTRY.register(Counter(
+    'sync_matched_total', 'Provider subscriptions matched to a Telegram user', ('provider',)))
+SYNC_UPDATED = REGISTRY.register(Counter(
+    'sync_updated_total', 'User rows updated by the subscription sync', ('provider',)))
+SYNC_LAST_SUCCESS = REGISTRY.register(Gauge(
+    'sync_last_run_timestamp_seconds', 'Unix time a provider was last synced completely', ('provider',)))
+SYNC_REQUESTS = REGISTRY.register(Counter(
+    'sync_requests_total', 'Sync requests by outcome (started, joined, queued, locked)', ('outcome',)))
+
+# Outgoing messages
+MESSAGES_SENT = REGISTRY.register(Counter(
+    'bot_messages_total', 'Bulk messages sent by reminders and broadcasts', ('kind', 'result')))
+RETRY_AFTER = REGISTRY.register(Counter(
+    'telegram_retry_after_total', 'RetryAfter (flood control) errors returned by Telegram', ('kind',)))
+OUTBOUND_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'outbound_queue_depth', 'Bot API calls waiting in the outbound queue', ('priority',)))
+OUTBOUND_WAIT = REGISTRY.register(Histogram(
+    'outbound_queue_wait_seconds', 'Time Bot API calls spend in the outbound queue', ('priority',)))
+
+# Group access enforcement
+ENFORCEMENT_ACTIONS = REGISTRY.register(Counter(
+    'enforcement_actions_total', 'Group ban/restrict actions by the enforcement engine', ('action', 'result')))
+
+# Database
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Duration of single SQL statements', buckets=DB_BUCKETS))
+DB_SESSION_DURATION = REGISTRY.register(Histogram(
+    'db_connection_hold_seconds', 'Time a DB connection stays checked out by a session', buckets=DB_BUCKETS))
+
+def instrument_handler(func):
+    """Decorator recording latency and errors of an async handler or job (and its DB usage when profiling)"""
+    name = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with profile_unit(name):
+                return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+def record_send_failure(kind, error):
+    """Count a failed bulk send and flag Telegram flood control separately"""
+    from telegram.error import RetryAfter
+
+    MESSAGES_SENT.inc(kind=kind, result='failed')
+    if isinstance(error, RetryAfter):
+        RETRY_AFTER.inc(kind=kind)
+
+def instrument_engine(engine):
+    """Attach query and connection timing listeners to a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_start_time'].pop()
+        DB_QUERY_DURATION.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checkout_time'] = time.perf_counter()
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checkout_time', None)
+        if started is not None:
+            DB_SESSION_DURATION.observe(time.perf_counter() - started)
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    Serve /metrics in the Prometheus text format from a background thread
+
+    Args:
+        port (int): Port to listen on
+        host (str): Interface to bind, local only by default
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            data = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Database Migration
+------------------
+Creates missing tables and columns. Run it once per deploy and start the
+bot and worker with AUTO_MIGRATE=0 to keep restarts fast.
+"""
+
+import logging
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+from models import init_db
+
+if __name__ == "__main__":
+    init_db()
@@ -1,25 +1,28 @@
 import logging
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import (
+    create_engine, event, inspect, text, Column, Integer, String, DateTime, Date, Boolean, Text, LargeBinary,
+    Index, PrimaryKeyConstraint, UniqueConstraint
+)
+from sqlalchemy.orm import declarative_base, sessionmaker, with_loader_criteria
 from config import DATABASE_URL
+from modules.tenants import DEFAULT_TENANT_ID, current_tenant_id
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Database setup
 Base = declarative_base()
 
-class User(Base):
+class TenantScoped:
+    """Mixin for rows owned by one tenant; ORM queries only see the current tenant's rows"""
+    tenant_id = Column(String, nullable=False, default=current_tenant_id, server_default=DEFAULT_TENANT_ID)
+
+class User(TenantScoped, Base):
     """User model for storing Telegram user data and subscription information"""
     __tablename__ = 'users'
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, unique=True)
+    telegram_id = Column(Integer)
     username = Column(String)
     first_name = Column(String)
     last_name = Column(String)
@@ -30,6 +33,17 @@ class User(Base):
     last_reminder_sent = Column(DateTime, nullable=True)
     joined_date = Column(DateTime, default=datetime.now)
     email = Column(String, nullable=True)  # Email field for subscription linking
+    # Provider identifiers stored by sync and email linking, used to build cancel links offline
+    ainox_subscriber_id = Column(String, nullable=True)
+    wix_order_id = Column(String, nullable=True)
+    wix_contact_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        # A Telegram user can be a member of several tenants' groups
+        UniqueConstraint('tenant_id', 'telegram_id'),
+        # Used by the /stats aggregates and the reminder job filters
+        Index('ix_users_tenant_status_end_date', 'tenant_id', 'subscription_status', 'subscription_end_date'),
+    )
 
     def __repr__(self):
         return f"<User(telegram_id={self.telegram_id}, name='{self.first_name}', status='{self.subscription_status}')>"
@@ -65,12 +79,188 @@ class User(Base):
             
         return (self.subscription_end_date - datetime.now()).days
 
-# Initialize database
-try:
-    engine = create_engine(DATABASE_URL)
-    Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
-    logger.info(f"Database initialized at {DATABASE_URL}")
-except Exception as e:
-    logger.error(f"Failed to initialize database: {e}")
-    raise
+class SyncState(TenantScoped, Base):
+    """Incremental sync progress for a payment provider"""
+    __tablename__ = 'sync_state'
+    __table_args__ = (PrimaryKeyConstraint('tenant_id', 'provider'),)
+    
+    provider = Column(String)  # 'wix', 'ainox'
+    watermark = Column(String, nullable=True)  # Last seen change timestamp (Wix order updatedDate)
+    markers = Column(Text, nullable=True)  # JSON map of record id -> change marker (Ainox)
+    last_sync = Column(DateTime, nullable=True)
+    last_full_sync = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<SyncState(provider='{self.provider}', watermark='{self.watermark}')>"
+
+class SyncLease(TenantScoped, Base):
+    """Cross-process lock held while a subscription sync runs"""
+    __tablename__ = 'sync_leases'
+    __table_args__ = (PrimaryKeyConstraint('tenant_id', 'name'),)
+    
+    name = Column(String)  # 'subscriptions'
+    run_id = Column(String, nullable=False)
+    owner = Column(String, nullable=False)  # host:pid of the holding process
+    acquired_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SyncLease(name='{self.name}', run_id='{self.run_id}', owner='{self.owner}')>"
+
+class DailyStats(TenantScoped, Base):
+    """Subscription counts materialised once a day by the reminder job"""
+    __tablename__ = 'daily_stats'
+    __table_args__ = (PrimaryKeyConstraint('tenant_id', 'day'),)
+    
+    day = Column(Date)
+    total = Column(Integer, default=0)
+    active = Column(Integer, default=0)
+    expired = Column(Integer, default=0)
+    no_subscription = Column(Integer, default=0)
+    expiring_soon = Column(Integer, default=0)  # Active subscriptions ending within 7 days
+    russian_card = Column(Integer, default=0)  # Active subscriptions paid with a Russian card
+    international_card = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<DailyStats(day={self.day}, active={self.active}, total={self.total})>"
+
+class GroupAccess(TenantScoped, Base):
+    """Last group access action applied to a user by the enforcement engine"""
+    __tablename__ = 'group_access'
+    __table_args__ = (PrimaryKeyConstraint('tenant_id', 'telegram_id'),)
+    
+    telegram_id = Column(Integer)
+    state = Column(String, default='allowed')  # 'allowed', 'removed'
+    mode = Column(String, nullable=True)  # 'ban' or 'restrict', the action used for removal
+    failed_action = Column(String, nullable=True)  # 'remove' or 'restore' that keeps failing
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<GroupAccess(telegram_id={self.telegram_id}, state='{self.state}')>"
+
+class SheetExportRow(TenantScoped, Base):
+    """Snapshot of a user row last written to the Google Sheet"""
+    __tablename__ = 'sheet_export_rows'
+    __table_args__ = (
+        PrimaryKeyConstraint('tenant_id', 'telegram_id'),
+        UniqueConstraint('tenant_id', 'row_number'),
+    )
+    
+    telegram_id = Column(Integer)
+    row_number = Column(Integer, nullable=False)  # 1-based sheet row, row 1 is the header
+    row_hash = Column(String, nullable=False)
+
+class PersistenceEntry(TenantScoped, Base):
+    """Conversation state or user_data entry stored by SQLPersistence"""
+    __tablename__ = 'persistence'
+    __table_args__ = (PrimaryKeyConstraint('tenant_id', 'namespace', 'key'),)
+    
+    namespace = Column(String)  # 'user_data', 'chat_data', 'conversation:<name>', ...
+    key = Column(String)  # JSON encoded id or conversation key
+    value = Column(LargeBinary, nullable=False)  # Pickled value
+    updated_at = Column(DateTime, default=datetime.now)
+
+class Job(Base):
+    """Background job queued by the bot and executed by the standalone worker"""
+    __tablename__ = 'jobs'
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False, index=True)  # 'sync', 'reminders'
+    tenant_id = Column(String, nullable=False, default=current_tenant_id, server_default=DEFAULT_TENANT_ID)
+    status = Column(String, default='pending', index=True)  # 'pending', 'running', 'done', 'failed'
+    payload = Column(Text, nullable=True)  # JSON encoded arguments
+    result = Column(Text, nullable=True)  # JSON encoded result
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
+
+# Database engine and session factory (no connection is made until first use)
+engine = create_engine(DATABASE_URL)
+Session = sessionmaker(bind=engine)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _scope_to_tenant(execute_state):
+    """Restrict ORM selects, updates and deletes of TenantScoped tables to the current tenant"""
+    if execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    tenant_id = current_tenant_id()
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantScoped, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+    )
+
+def _key_sets(table):
+    """Primary key and unique column sets declared on a model table"""
+    keys = {frozenset(column.name for column in table.primary_key.columns)}
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            keys.add(frozenset(column.name for column in constraint.columns))
+    keys.update(frozenset(column.name for column in index.columns) for index in table.indexes if index.unique)
+    return keys
+
+def _existing_key_sets(inspector, table_name):
+    """Primary key and unique column sets of a table in the database"""
+    keys = {frozenset(inspector.get_pk_constraint(table_name)['constrained_columns'])}
+    keys.update(frozenset(constraint['column_names']) for constraint in inspector.get_unique_constraints(table_name))
+    keys.update(frozenset(index['column_names']) for index in inspector.get_indexes(table_name) if index['unique'])
+    return keys
+
+def _rebuild_table(conn, inspector, table):
+    """Recreate a table whose keys changed and copy its rows over"""
+    existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+    for index in inspector.get_indexes(table.name):
+        if not index.get('duplicates_constraint'):
+            conn.execute(text(f"DROP INDEX {index['name']}"))
+
+    old_name = f"{table.name}_before_migration"
+    conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {old_name}"))
+    table.create(conn)
+    columns = ', '.join(column.name for column in table.columns if column.name in existing_columns)
+    conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}"))
+    conn.execute(text(f"DROP TABLE {old_name}"))
+    logger.info(f"Rebuilt table {table.name} with new keys")
+
+def init_db():
+    """
+    Create missing tables and add columns introduced by newer versions
+
+    This is the explicit migration step. It runs from migrate.py, or at bot and
+    worker startup unless AUTO_MIGRATE is disabled.
+    """
+    try:
+        Base.metadata.create_all(engine)
+        
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing_columns:
+                        continue
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    default = f" DEFAULT '{column.server_default.arg}'" if column.server_default is not None else ''
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+                    logger.info(f"Added column {table.name}.{column.name}")
+                
+                # Keys can't be altered in place (e.g. tenant_id joining the primary key), so rebuild
+                table_inspector = inspect(conn)
+                if _existing_key_sets(table_inspector, table.name) != _key_sets(table):
+                    _rebuild_table(conn, table_inspector, table)
+                # Indexes declared after a table was created are not added by create_all
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+        
+        logger.info(f"Database initialized at {DATABASE_URL}")
+    except Exception as e:
+        logger.error(f"Failed to initialize database: {e}")
+        raise
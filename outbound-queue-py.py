@@ -0,0 +1,114 @@
+import logging
+import time
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE_PER_MINUTE, OUTBOUND_MAX_RETRIES
+)
+from modules.metrics import OUTBOUND_QUEUE_DEPTH, OUTBOUND_WAIT, RETRY_AFTER
+from modules.rate_limit import PriorityTokenBucket, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, passed as `rate_limit_args` to Bot methods. Calls without
+# one (replies in handlers, callback answers) are interactive.
+INTERACTIVE = 0
+TRANSACTIONAL = 1
+BULK = 2
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', TRANSACTIONAL: 'transactional', BULK: 'bulk'}
+
+# Endpoints posting into a chat, subject to the per-chat limits
+CHAT_ENDPOINT_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+# Per-chat buckets unused for this long are dropped
+CHAT_BUCKET_IDLE_SECONDS = 120
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Outbound queue for the Bot API calls of one Bot instance
+
+    Calls wait for their chat's bucket (OUTBOUND_CHAT_RATE per second in private
+    chats, OUTBOUND_GROUP_RATE_PER_MINUTE in groups) and then for the global
+    bucket (OUTBOUND_GLOBAL_RATE per second). Both serve interactive calls
+    before transactional ones and those before bulk sends, so a reply in the
+    group is not queued behind a broadcast. RetryAfter answers pause the global
+    bucket and the call is retried up to OUTBOUND_MAX_RETRIES times.
+
+    Each limiter only sees the calls of its own Bot instance; processes sharing
+    a bot token have to split OUTBOUND_GLOBAL_RATE between them.
+    """
+    def __init__(
+        self,
+        global_rate=OUTBOUND_GLOBAL_RATE,
+        chat_rate=OUTBOUND_CHAT_RATE,
+        group_rate_per_minute=OUTBOUND_GROUP_RATE_PER_MINUTE,
+        max_retries=OUTBOUND_MAX_RETRIES
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self._global_bucket = None
+        self._chat_buckets = {}
+
+    async def initialize(self):
+        # Created here so the asyncio primitives belong to the running loop
+        self._global_bucket = PriorityTokenBucket(self.global_rate)
+
+    async def shutdown(self):
+        self._chat_buckets.clear()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items()
+                    if not value.is_idle(CHAT_BUCKET_IDLE_SECONDS)
+                }
+            if isinstance(chat_id, str) or chat_id < 0:
+                # Groups and channels: per-minute limit, bursts up to the full minute allowance
+                bucket = PriorityTokenBucket(self.group_rate_per_minute / 60, self.group_rate_per_minute)
+            else:
+                # Private chats: allow a reply and its follow-up menu message at once
+                bucket = PriorityTokenBucket(self.chat_rate, 3)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint == 'getUpdates':
+            return await callback(*args, **kwargs)
+
+        if self._global_bucket is None:
+            await self.initialize()
+
+        priority = rate_limit_args if rate_limit_args in PRIORITY_NAMES else INTERACTIVE
+        priority_name = PRIORITY_NAMES[priority]
+        chat_id = data.get('chat_id')
+        chat_bucket = self._chat_bucket(chat_id) if chat_id is not None and endpoint.startswith(CHAT_ENDPOINT_PREFIXES) else None
+
+        retries = 0
+        while True:
+            started = time.perf_counter()
+            OUTBOUND_QUEUE_DEPTH.inc(priority=priority_name)
+            try:
+                if chat_bucket:
+                    await chat_bucket.acquire(priority)
+                await self._global_bucket.acquire(priority)
+            finally:
+                OUTBOUND_QUEUE_DEPTH.dec(priority=priority_name)
+            OUTBOUND_WAIT.observe(time.perf_counter() - started, priority=priority_name)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                wait = retry_after_seconds(e)
+                RETRY_AFTER.inc(kind=f"outbound_{priority_name}")
+                self._global_bucket.pause(wait)
+                if retries >= self.max_retries:
+                    raise
+                retries += 1
+                logger.warning(f"Flood control on {endpoint}, retrying in {wait}s ({retries}/{self.max_retries})")
@@ -1,40 +1,39 @@
+import asyncio
+import json
 import logging
 import hashlib
+import time
 import traceback
 from datetime import datetime, timedelta
-import requests
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from google.oauth2.service_account import Credentials
 
 # Import models and config
-from models import User, Session
-from config import (
-    AINOX_URL, AINOX_LOGIN, AINOX_KEY, 
-    WIX_API_KEY, WIX_SITE_ID,
-    CREDENTIALS_PATH, SHEET_ID
+from models import User, SyncState, Session
+from modules.provider_client import (
+    wix_client, ainox_client, ProviderUnavailable, seconds_until_providers_retry
 )
+from modules.metrics import (
+    instrument_handler, SYNC_DURATION, SYNC_MATCHED, SYNC_UPDATED, SYNC_LAST_SUCCESS
+)
+from modules.tenants import current_tenant
+from config import AINOX_URL, WIX_API_URL, FULL_SYNC_INTERVAL
 
-# Configure logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# API headers
-AINOX_HEADERS = {
-    'api-login': AINOX_LOGIN,
-    'api-key': AINOX_KEY
-}
-
-def generate_ainox_unsubscribe_link(email):
+def generate_ainox_unsubscribe_link(email, subscriber_id=None):
     """
     Generate an Ainox-style unsubscribe link for a given email
     
     Args:
         email (str): The user's email address
+        subscriber_id (str): Ainox subscriber ID stored on the user. When given the link
+            is built locally; otherwise it is looked up in Ainox by email.
         
     Returns:
         str: A properly formatted Ainox unsubscribe URL
     """
+    if subscriber_id:
+        return _ainox_unsubscribe_url(email, subscriber_id)
+    
     try:
         # Find the subscriber ID by email
         subscribers_data = {
@@ -46,10 +45,10 @@ def generate_ainox_unsubscribe_link(email):
             "fields": ["id"]
         }
         
-        response = requests.post(
+        response = ainox_client.post(
             AINOX_URL,
             json=subscribers_data,
-            headers=AINOX_HEADERS
+            headers=current_tenant().ainox_headers
         )
         
         if response.status_code == 200 and 'data' in response.json():
@@ -57,12 +56,7 @@ def generate_ainox_unsubscribe_link(email):
             if subscribers:
                 subscriber_id = subscribers[0].get('id')
                 if subscriber_id:
-                    # Generate the hash part using MD5 (similar to how Ainox does it)
-                    hash_input = f"{email}:{subscriber_id}"
-                    hash_output = hashlib.md5(hash_input.encode()).hexdigest()
-                    
-                    # Format the URL with the subscriber ID and hash
-                    return f"https://onlayn-meditaciya-na-procvetanie.ainox.pro/unsubscribe::{subscriber_id}::{hash_output}"
+                    return _ainox_unsubscribe_url(email, subscriber_id)
         
         # If we couldn't find a subscription or generate a proper link, return the generic page
         logger.warning(f"Could not generate specific unsubscribe link for {email}")
@@ -72,19 +66,132 @@ def generate_ainox_unsubscribe_link(email):
         logger.error(f"Error generating unsubscribe link: {e}")
         return "https://onlayn-meditaciya-na-procvetanie.ainox.pro/unsubscribe"
 
+def _ainox_unsubscribe_url(email, subscriber_id):
+    # Generate the hash part using MD5 (similar to how Ainox does it)
+    hash_input = f"{email}:{subscriber_id}"
+    hash_output = hashlib.md5(hash_input.encode()).hexdigest()
+    
+    # Format the URL with the subscriber ID and hash
+    return f"https://onlayn-meditaciya-na-procvetanie.ainox.pro/unsubscribe::{subscriber_id}::{hash_output}"
+
+def store_provider_ids(db_user, subscription_info):
+    """
+    Copy provider identifiers of an active subscription onto the user
+
+    Only the provider of that subscription keeps its IDs; the other provider's
+    are cleared so the cancel flow never routes to a stale subscription.
+
+    Args:
+        db_user (User): User to update, committed by the caller
+        subscription_info (dict): Active result of get_subscriber_info, get_ainox_subscriber_info
+            or verify_subscription_by_email
+    """
+    if subscription_info.get('payment_method') == 'russian':
+        db_user.ainox_subscriber_id = str(subscription_info['subscriber_id']) if subscription_info.get('subscriber_id') else None
+        db_user.wix_order_id = None
+        db_user.wix_contact_id = None
+    elif subscription_info.get('payment_method') == 'international':
+        db_user.wix_order_id = subscription_info.get('order_id') or None
+        db_user.wix_contact_id = subscription_info.get('contact_id') or None
+        db_user.ainox_subscriber_id = None
+
+def wix_order_end_date(order):
+    """
+    Return the end of the month the order's current period started in
+
+    Args:
+        order (dict): Wix pricing-plans order
+
+    Returns:
+        datetime: Last second of the start month, or None if the order has no usable date
+    """
+    created_date = order.get('startDate', order.get('createdDate', ''))
+    if not created_date:
+        return None
+    try:
+        date_obj = datetime.fromisoformat(created_date.replace('Z', '+00:00'))
+    except (ValueError, TypeError):
+        logger.error(f"Error calculating end date from: {created_date}")
+        return None
+    
+    # Get the last day of the current month
+    current_month = date_obj.month
+    current_year = date_obj.year
+    if current_month in [4, 6, 9, 11]:
+        last_day = 30
+    elif current_month == 2:
+        if (current_year % 4 == 0 and current_year % 100 != 0) or (current_year % 400 == 0):
+            last_day = 29  # Leap year
+        else:
+            last_day = 28
+    else:
+        last_day = 31
+    return datetime(current_year, current_month, last_day, 23, 59, 59)
+
+def _wix_order_rank(order):
+    # Latest end date wins; updatedDate and the order id break ties so the pick
+    # does not depend on the order the API lists them in
+    return (
+        wix_order_end_date(order) or datetime.min,
+        order.get('updatedDate') or order.get('createdDate') or '',
+        str(order.get('id', ''))
+    )
+
+def group_orders_by_buyer(orders):
+    """
+    Group Wix orders by buyer contact
+
+    A buyer who renewed or switched plans has several active orders, but only
+    one contact to look up.
+
+    Args:
+        orders (list): Wix pricing-plans orders
+
+    Returns:
+        dict: contactId -> list of that buyer's orders, latest end date first.
+            Orders without a contact are keyed by their own id.
+    """
+    groups = {}
+    for order in orders:
+        contact_id = (order.get('buyer') or {}).get('contactId') or f"order:{order.get('id', '')}"
+        groups.setdefault(contact_id, []).append(order)
+    for buyer_orders in groups.values():
+        buyer_orders.sort(key=_wix_order_rank, reverse=True)
+    return groups
+
+def latest_order_per_buyer(orders):
+    """
+    Keep one order per buyer: the one with the latest end date
+
+    Args:
+        orders (list): Wix pricing-plans orders
+
+    Returns:
+        list: One order per buyer contact
+    """
+    return [buyer_orders[0] for buyer_orders in group_orders_by_buyer(orders).values()]
+
 class WixSubscriptionManager:
     """Class to handle Wix subscription API interactions"""
-    def __init__(self, api_key=WIX_API_KEY, site_id=WIX_SITE_ID):
+    def __init__(self, api_key=None, site_id=None):
+        # Credentials of the current tenant unless given explicitly
+        tenant = current_tenant()
         self.headers = {
-            "Authorization": api_key,
-            "wix-site-id": site_id,
+            "Authorization": api_key or tenant.wix_api_key,
+            "wix-site-id": site_id or tenant.wix_site_id,
             "Content-Type": "application/json"
         }
 
     def get_purchased_plans(self):
-        """Get all active orders with 'online' in plan name"""
-        endpoint = "https://www.wixapis.com/pricing-plans/v2/orders"
-        response = requests.get(endpoint, headers=self.headers)
+        """
+        Get all active orders with 'online' in plan name
+
+        Raises:
+            ProviderUnavailable: If Wix does not return the order list, so a sync
+                does not mistake the error for an empty list
+        """
+        endpoint = f"{WIX_API_URL}/pricing-plans/v2/orders"
+        response = wix_client.get(endpoint, headers=self.headers)
         
         if response.status_code == 200:
             all_orders = response.json().get('orders', [])
@@ -93,14 +200,14 @@ class WixSubscriptionManager:
                 logger.debug(f"Order: {order.get('id')}, Plan: {order.get('planName')}, Status: {order.get('status')}")
             return [order for order in all_orders if order.get('status', '').lower() == 'active']
         logger.error(f"Failed to get Wix orders: {response.status_code}, {response.text}")
-        return []
+        raise ProviderUnavailable(f"Wix orders request returned {response.status_code}")
 
     def get_subscriber_info(self, order):
         """Get subscriber information from a Wix order"""
         try:
             contact_id = order['buyer']['contactId']
-            response = requests.get(
-                f"https://www.wixapis.com/contacts/v4/contacts/{contact_id}",
+            response = wix_client.get(
+                f"{WIX_API_URL}/contacts/v4/contacts/{contact_id}",
                 headers=self.headers
             )
             
@@ -116,55 +223,36 @@ class WixSubscriptionManager:
                 status = order.get('status', '').lower()
                 is_active = status == 'active'
                 
-                # Extract renewal date from order
-                created_date = order.get('startDate', order.get('createdDate', ''))
-                end_date = None
-                
-                # Calculate end date to the last day of the month
-                if created_date:
-                    try:
-                        date_obj = datetime.fromisoformat(created_date.replace('Z', '+00:00'))
-                        
-                        # Get current month and year
-                        current_month = date_obj.month
-                        current_year = date_obj.year
-                        
-                        # Get the last day of the current month
-                        if current_month in [4, 6, 9, 11]:
-                            last_day = 30
-                        elif current_month == 2:
-                            if (current_year % 4 == 0 and current_year % 100 != 0) or (current_year % 400 == 0):
-                                last_day = 29  # Leap year
-                            else:
-                                last_day = 28
-                        else:
-                            last_day = 31
-                        
-                        # Set end date to the last day of the current month
-                        end_date = datetime(current_year, current_month, last_day, 23, 59, 59)
-                        
-                        logger.info(f"Calculated end date (end of month): {end_date}")
-                    except (ValueError, TypeError, KeyError):
-                        logger.error(f"Error calculating end date from: {created_date}")
+                end_date = wix_order_end_date(order)
+                logger.info(f"Calculated end date (end of month): {end_date}")
                 
                 return {
                     'email': email,
                     'is_active': is_active,
                     'end_date': end_date,
                     'payment_method': 'international',  # Wix is for international payments
-                    'order_id': order.get('id', '')
+                    'order_id': order.get('id', ''),
+                    'contact_id': contact_id
                 }
             
             logger.error(f"Failed to get contact info: {response.status_code}, {response.text}")
             return None
             
+        except ProviderUnavailable:
+            raise
         except Exception as e:
             logger.error(f"Error getting subscriber info: {e}")
             logger.error(traceback.format_exc())
             return None
 
 def get_ainox_subscribers():
-    """Get all subscribers from Ainox"""
+    """
+    Get all subscribers from Ainox
+
+    Raises:
+        ProviderUnavailable: If Ainox does not return the subscriber list, so a sync
+            does not mistake the error for an empty list
+    """
     subscribers_data = {
         "request": "subscriber",
         "type": "output",
@@ -173,13 +261,13 @@ def get_ainox_subscribers():
         "fields": ["id", "email", "status", "next_payment_date", "next_payment_price", "price", "first_invoice_id"]
     }
 
-    response = requests.post(AINOX_URL, json=subscribers_data, headers=AINOX_HEADERS)
+    response = ainox_client.post(AINOX_URL, json=subscribers_data, headers=current_tenant().ainox_headers)
     
     if response.status_code == 200 and 'data' in response.json():
         return response.json()['data']
     
     logger.error(f"Failed to get Ainox subscribers: {response.status_code}, {response.text}")
-    return []
+    raise ProviderUnavailable(f"Ainox subscribers request returned {response.status_code}")
 
 def get_ainox_subscriber_info(subscriber):
     """Process Ainox subscriber data"""
@@ -199,7 +287,7 @@ def get_ainox_subscriber_info(subscriber):
                 "id": first_invoice_id
             }
 
-            parent_response = requests.post(AINOX_URL, json=parent_request_data, headers=AINOX_HEADERS)
+            parent_response = ainox_client.post(AINOX_URL, json=parent_request_data, headers=current_tenant().ainox_headers)
             
             if parent_response.status_code == 200:
                 parent_response_json = parent_response.json()
@@ -229,6 +317,8 @@ def get_ainox_subscriber_info(subscriber):
             'phone': phone,
             'subscriber_id': subscriber_id
         }
+    except ProviderUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error processing Ainox subscriber: {e}")
         return None
@@ -244,6 +334,7 @@ def update_user_subscription_status(telegram_id, subscription_info):
                 db_user.subscription_status = 'active'
                 db_user.subscription_end_date = subscription_info['end_date']
                 db_user.is_russian_card = subscription_info['payment_method'] == 'russian'
+                store_provider_ids(db_user, subscription_info)
             else:
                 # Only mark as expired if it was previously active
                 if db_user.subscription_status == 'active':
@@ -280,35 +371,195 @@ def find_telegram_id_by_email(email):
     finally:
         db_session.close()
 
-async def sync_subscriptions():
-    """Main function to sync all subscription data"""
-    logger.info("Starting subscription sync")
+def load_sync_state(provider):
+    """
+    Load incremental sync progress for a provider
+
+    Returns:
+        dict: watermark, markers and last_full_sync (empty state if the provider never synced)
+    """
+    db_session = Session()
+    try:
+        state = db_session.query(SyncState).filter_by(provider=provider).first()
+        if not state:
+            return {'watermark': None, 'markers': {}, 'last_full_sync': None}
+        return {
+            'watermark': state.watermark,
+            'markers': json.loads(state.markers) if state.markers else {},
+            'last_full_sync': state.last_full_sync
+        }
+    finally:
+        db_session.close()
+
+def save_sync_state(provider, watermark=None, markers=None, full=False):
+    """Store sync progress after a provider pass completed"""
+    db_session = Session()
+    try:
+        state = db_session.query(SyncState).filter_by(provider=provider).first()
+        if not state:
+            state = SyncState(provider=provider)
+            db_session.add(state)
+        now = datetime.now()
+        state.watermark = watermark
+        if markers is not None:
+            state.markers = json.dumps(markers)
+        state.last_sync = now
+        if full:
+            state.last_full_sync = now
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def is_full_sync_due(state):
+    """Check if a provider needs a full reconciliation instead of an incremental pass"""
+    if not state['last_full_sync']:
+        return True
+    return datetime.now() - state['last_full_sync'] >= timedelta(seconds=FULL_SYNC_INTERVAL)
+
+def ainox_change_marker(subscriber):
+    """Short fingerprint of the Ainox subscriber fields the sync depends on"""
+    raw = f"{subscriber.get('email', '')}|{subscriber.get('status')}|{subscriber.get('next_payment_date')}"
+    return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+def _apply_subscriber_info(provider, subscriber_info, stats):
+    """Match one provider record to a user and update it, counting the outcome"""
+    stats['fetched'] += 1
+    telegram_id = find_telegram_id_by_email(subscriber_info['email'])
+    if telegram_id:
+        stats['matched'] += 1
+        SYNC_MATCHED.inc(provider=provider)
+        if update_user_subscription_status(telegram_id, subscriber_info):
+            stats['updated'] += 1
+            SYNC_UPDATED.inc(provider=provider)
+
+def sync_subscriptions_blocking(full=None):
+    """
+    Main function to sync all subscription data
+
+    Blocks on the provider HTTP calls and the database; async callers use
+    sync_subscriptions, which runs it in a thread.
+
+    In incremental mode only Wix orders updated after the stored watermark and Ainox
+    subscribers whose change marker differs are looked up and written. A provider
+    gets a full reconciliation when `full` is True or FULL_SYNC_INTERVAL has passed.
+
+    Args:
+        full (bool): Force a full (True) or incremental (False) sync, None decides per provider
+
+    Returns:
+        dict: Per provider counts of fetched, skipped, failed, matched and updated records and the run duration;
+            for Wix also the number of orders merged into another order of the same buyer. `unavailable`
+            is set for a provider whose pass was abandoned because the provider could not be reached.
+    """
+    logger.info(f"Starting subscription sync for tenant {current_tenant().id}")
+    started = time.perf_counter()
+    stats = {
+        'wix': {'full': False, 'unavailable': False, 'fetched': 0, 'skipped': 0, 'failed': 0, 'duplicates': 0, 'matched': 0, 'updated': 0},
+        'ainox': {'full': False, 'unavailable': False, 'fetched': 0, 'skipped': 0, 'failed': 0, 'matched': 0, 'updated': 0}
+    }
     
     # Get Wix subscriptions
-    wix_manager = WixSubscriptionManager()
-    wix_orders = wix_manager.get_purchased_plans()
-    
-    for order in wix_orders:
-        subscriber_info = wix_manager.get_subscriber_info(order)
-        if subscriber_info:
-            telegram_id = find_telegram_id_by_email(subscriber_info['email'])
-            if telegram_id:
-                update_user_subscription_status(telegram_id, subscriber_info)
+    try:
+        state = load_sync_state('wix')
+        wix_full = full if full is not None else is_full_sync_due(state)
+        stats['wix']['full'] = wix_full
+        watermark = state['watermark']
+        new_watermark = watermark
+        
+        wix_manager = WixSubscriptionManager()
+        wix_orders = wix_manager.get_purchased_plans()
+        
+        # One contact lookup per buyer, using the order with the latest end date
+        buyer_groups = group_orders_by_buyer(wix_orders)
+        stats['wix']['duplicates'] = len(wix_orders) - len(buyer_groups)
+        
+        # Change dates of buyers whose contact lookup failed; the watermark must stay below them
+        failed_dates = []
+        synced_dates = []
+        
+        for buyer_orders in buyer_groups.values():
+            # ISO 8601 timestamps in the same format compare correctly as strings
+            updated_dates = [order.get('updatedDate') or order.get('createdDate') or '' for order in buyer_orders]
+            updated_date = max(updated_dates)
+            # Refresh the buyer if any of their orders changed since the last sync
+            if not wix_full and watermark and updated_date and updated_date <= watermark:
+                stats['wix']['skipped'] += 1
+                continue
+            
+            subscriber_info = wix_manager.get_subscriber_info(buyer_orders[0])
+            if subscriber_info:
+                _apply_subscriber_info('wix', subscriber_info, stats['wix'])
+                synced_dates.append(updated_date)
+            else:
+                failed_dates.append(updated_date)
+        
+        # Advance only past changes that were synced and older than the first failed one,
+        # so failed buyers are retried by the next incremental run
+        stats['wix']['failed'] = len(failed_dates)
+        if failed_dates:
+            synced_dates = [date for date in synced_dates if date < min(failed_dates)]
+        for updated_date in synced_dates:
+            if updated_date and (new_watermark is None or updated_date > new_watermark):
+                new_watermark = updated_date
+        
+        save_sync_state('wix', watermark=new_watermark, full=wix_full)
+        SYNC_LAST_SUCCESS.set(time.time(), provider='wix')
+    except ProviderUnavailable as e:
+        # Sync state and the success timestamp stay as they were, the next run retries
+        stats['wix']['unavailable'] = True
+        logger.warning(f"Skipping Wix sync: {e}")
     
     # Get Ainox subscriptions
-    ainox_subscribers = get_ainox_subscribers()
-    
-    for subscriber in ainox_subscribers:
-        subscriber_info = get_ainox_subscriber_info(subscriber)
-        if subscriber_info:
-            telegram_id = find_telegram_id_by_email(subscriber_info['email'])
-            if telegram_id:
-                update_user_subscription_status(telegram_id, subscriber_info)
+    try:
+        state = load_sync_state('ainox')
+        ainox_full = full if full is not None else is_full_sync_due(state)
+        stats['ainox']['full'] = ainox_full
+        markers = state['markers']
+        new_markers = {}
+        
+        ainox_subscribers = get_ainox_subscribers()
+        
+        for subscriber in ainox_subscribers:
+            subscriber_id = str(subscriber.get('id', ''))
+            marker = ainox_change_marker(subscriber)
+            if not ainox_full and markers.get(subscriber_id) == marker:
+                new_markers[subscriber_id] = marker
+                stats['ainox']['skipped'] += 1
+                continue
+            
+            subscriber_info = get_ainox_subscriber_info(subscriber)
+            if subscriber_info:
+                _apply_subscriber_info('ainox', subscriber_info, stats['ainox'])
+                new_markers[subscriber_id] = marker
+            else:
+                # Keep the old marker so the next incremental run retries this subscriber
+                stats['ainox']['failed'] += 1
+                if subscriber_id in markers:
+                    new_markers[subscriber_id] = markers[subscriber_id]
+        
+        save_sync_state('ainox', markers=new_markers, full=ainox_full)
+        SYNC_LAST_SUCCESS.set(time.time(), provider='ainox')
+    except ProviderUnavailable as e:
+        stats['ainox']['unavailable'] = True
+        logger.warning(f"Skipping Ainox sync: {e}")
     
-    logger.info("Subscription sync completed")
+    stats['duration'] = round(time.perf_counter() - started, 3)
+    SYNC_DURATION.observe(stats['duration'])
+    logger.info(f"Subscription sync for tenant {current_tenant().id} completed: {stats}")
+    return stats
+
+async def sync_subscriptions(full=None):
+    """Run sync_subscriptions_blocking in a thread so the event loop keeps serving updates"""
+    # to_thread copies the context, so the sync runs for the current tenant
+    return await asyncio.to_thread(sync_subscriptions_blocking, full)
 
 async def verify_subscription_by_email(email):
-    """Verify if an email has an active subscription and return proper provider info"""
+    """
+    Verify if an email has an active subscription and return proper provider info
+
+    Raises:
+        ProviderUnavailable: If a provider is down, so callers can answer from the DB
+    """
     try:
         normalized_email = email.lower().strip()
         logger.info(f"Verifying subscription for email: {normalized_email}")
@@ -320,7 +571,7 @@ async def verify_subscription_by_email(email):
         # Check Wix FIRST (this is the key change - prioritize Wix over Ainox)
         logger.info("Checking Wix subscriptions...")
         wix_manager = WixSubscriptionManager()
-        wix_orders = wix_manager.get_purchased_plans()
+        wix_orders = latest_order_per_buyer(wix_manager.get_purchased_plans())
         
         for order in wix_orders:
             subscriber_info = wix_manager.get_subscriber_info(order)
@@ -345,7 +596,7 @@ async def verify_subscription_by_email(email):
             "fields": ["id", "email", "status", "next_payment_date"]
         }
         
-        response = requests.post(AINOX_URL, json=subscribers_data, headers=AINOX_HEADERS)
+        response = ainox_client.post(AINOX_URL, json=subscribers_data, headers=current_tenant().ainox_headers)
         
         if response.status_code == 200 and 'data' in response.json():
             subscribers = response.json()['data']
@@ -377,7 +628,7 @@ async def verify_subscription_by_email(email):
                         'is_active': True,
                         'end_date': next_payment_date,
                         'payment_method': 'russian',
-                        'subscriber_id': subscriber.get('id')
+                        'subscriber_id': str(subscriber.get('id', ''))
                     }
                     return True, ainox_result
         
@@ -385,12 +636,44 @@ async def verify_subscription_by_email(email):
         logger.info(f"No active subscription found for: {email}")
         return False, {}
     
+    except ProviderUnavailable:
+        # Let callers fall back to the last known DB state
+        raise
     except Exception as e:
         logger.error(f"Error verifying subscription: {e}")
         logger.error(traceback.format_exc())  # Add detailed error tracing
         return False, {}
 
-# Function to be called from the main bot
-async def schedule_subscription_sync(context):
-    """Function to be called by the job queue"""
-    await sync_subscriptions()
\ No newline at end of file
+@instrument_handler
+async def refresh_user_subscription(context):
+    """Job to refresh a single user's subscription in the background"""
+    telegram_id = context.job.data
+    db_session = Session()
+    try:
+        db_user = db_session.query(User).filter_by(telegram_id=telegram_id).first()
+        email = db_user.email if db_user else None
+    finally:
+        db_session.close()
+    
+    if not email:
+        return
+    
+    try:
+        is_subscribed, subscription_info = await verify_subscription_by_email(email)
+    except ProviderUnavailable as e:
+        logger.warning(f"Background refresh for user {telegram_id} skipped: {e}")
+        return
+    
+    if not is_subscribed:
+        subscription_info = {'is_active': False}
+    update_user_subscription_status(telegram_id, subscription_info)
+
+def schedule_subscription_refresh(context, telegram_id):
+    """Schedule a background subscription refresh once the provider breakers allow it"""
+    job_name = f"refresh_subscription_{telegram_id}"
+    if context.job_queue.get_jobs_by_name(job_name):
+        return
+    
+    when = seconds_until_providers_retry() + 1
+    context.job_queue.run_once(refresh_user_subscription, when, data=telegram_id, name=job_name)
+    logger.info(f"Scheduled subscription refresh for user {telegram_id} in {int(when)}s")
\ No newline at end of file
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import pickle
+from datetime import datetime
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from models import PersistenceEntry, Session
+from config import PERSISTENCE_FLUSH_INTERVAL
+from modules.tenants import current_tenant, tenant_scope
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_PREFIX = 'conversation:'
+
+class SQLPersistence(BasePersistence):
+    """
+    Persistence keeping conversations and user_data in the bot database
+
+    The Application hands over changed entries every PERSISTENCE_FLUSH_INTERVAL
+    seconds. Only those dirty keys are written, all in one transaction, so a
+    flush costs the same however many users are stored. Values are pickled like
+    in PicklePersistence; chat_data, bot_data and callback_data are not stored
+    unless enabled through `store_data`. Entries belong to the tenant of the bot
+    the persistence was created for.
+    """
+    def __init__(self, tenant=None, store_data=None, update_interval=PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=store_data or PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        # (namespace, key) -> pickled value, or None to delete the row
+        self._dirty = {}
+        self._write_task = None
+        self.tenant = tenant or current_tenant()
+
+    # Loading
+
+    def _load(self, namespace):
+        db_session = Session()
+        try:
+            with tenant_scope(self.tenant):
+                rows = db_session.query(PersistenceEntry.key, PersistenceEntry.value).filter_by(namespace=namespace).all()
+        finally:
+            db_session.close()
+        entries = {}
+        for key, value in rows:
+            key = json.loads(key)
+            # Conversation keys are tuples of chat and user ids, stored as JSON lists
+            entries[tuple(key) if isinstance(key, list) else key] = pickle.loads(value)
+        return entries
+
+    async def get_user_data(self):
+        return self._load('user_data') if self.store_data.user_data else {}
+
+    async def get_chat_data(self):
+        return self._load('chat_data') if self.store_data.chat_data else {}
+
+    async def get_bot_data(self):
+        if not self.store_data.bot_data:
+            return {}
+        return self._load('bot_data').get('bot_data', {})
+
+    async def get_callback_data(self):
+        if not self.store_data.callback_data:
+            return None
+        return self._load('callback_data').get('callback_data')
+
+    async def get_conversations(self, name):
+        return self._load(CONVERSATION_PREFIX + name)
+
+    # Updates only mark entries dirty; the batch is written once the
+    # Application has handed over all changes of the current cycle
+
+    def _mark_dirty(self, namespace, key, value):
+        self._dirty[(namespace, json.dumps(key))] = None if value is None else pickle.dumps(value)
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self):
+        # Let the other update_* calls gathered with this one mark their keys first
+        await asyncio.sleep(0)
+        self._write_dirty()
+
+    def _write_dirty(self):
+        """Write all dirty entries in one transaction"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+
+        db_session = Session()
+        try:
+            with tenant_scope(self.tenant):
+                self._write_batch(db_session, dirty)
+            logger.debug(f"Persisted {len(dirty)} entries")
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Failed to persist {len(dirty)} entries, retrying on next flush: {e}")
+            # Keep the failed batch unless a newer value arrived meanwhile
+            for entry, value in dirty.items():
+                self._dirty.setdefault(entry, value)
+        finally:
+            db_session.close()
+
+    def _write_batch(self, db_session, dirty):
+        existing = set()
+        for namespace in {namespace for namespace, _ in dirty}:
+            keys = [key for entry_namespace, key in dirty if entry_namespace == namespace]
+            existing.update(
+                (namespace, key) for key, in db_session.query(PersistenceEntry.key).filter(
+                    PersistenceEntry.namespace == namespace, PersistenceEntry.key.in_(keys)
+                )
+            )
+
+        now = datetime.now()
+        inserts, updates = [], []
+        for (namespace, key), value in dirty.items():
+            if value is None:
+                if (namespace, key) in existing:
+                    db_session.query(PersistenceEntry).filter_by(namespace=namespace, key=key).delete()
+                continue
+            mapping = {'tenant_id': self.tenant.id, 'namespace': namespace, 'key': key, 'value': value, 'updated_at': now}
+            (updates if (namespace, key) in existing else inserts).append(mapping)
+
+        db_session.bulk_insert_mappings(PersistenceEntry, inserts)
+        db_session.bulk_update_mappings(PersistenceEntry, updates)
+        db_session.commit()
+
+    async def update_user_data(self, user_id, data):
+        self._mark_dirty('user_data', user_id, data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark_dirty('chat_data', chat_id, data)
+
+    async def update_bot_data(self, data):
+        self._mark_dirty('bot_data', 'bot_data', data)
+
+    async def update_callback_data(self, data):
+        self._mark_dirty('callback_data', 'callback_data', data)
+
+    async def update_conversation(self, name, key, new_state):
+        self._mark_dirty(CONVERSATION_PREFIX + name, list(key), new_state)
+
+    async def drop_user_data(self, user_id):
+        self._mark_dirty('user_data', user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark_dirty('chat_data', chat_id, None)
+
+    # Data is only changed through this process, nothing to refresh
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write everything still dirty, called by the Application on shutdown"""
+        if self._write_task and not self._write_task.done():
+            await self._write_task
+        self._write_dirty()
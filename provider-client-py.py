@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+import requests
+
+from config import (
+    WIX_TIMEOUT, AINOX_TIMEOUT,
+    PROVIDER_FAILURE_THRESHOLD, PROVIDER_RESET_TIMEOUT
+)
+from modules.metrics import PROVIDER_REQUESTS, PROVIDER_LATENCY
+
+logger = logging.getLogger(__name__)
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider call is rejected by the circuit breaker or fails at transport level"""
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a single provider
+
+    The breaker opens after `failure_threshold` consecutive failures. While open,
+    calls are rejected immediately. After `reset_timeout` seconds it goes half-open
+    and lets a single probe request through: success closes it, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=PROVIDER_FAILURE_THRESHOLD, reset_timeout=PROVIDER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def state(self):
+        """Return the current breaker state"""
+        with self._lock:
+            return self._current_state()
+
+    def seconds_until_retry(self):
+        """Return seconds left until the breaker lets a probe request through"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0
+            return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow_request(self):
+        """Check if a request may be sent to the provider"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """Close the breaker after a successful call"""
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Circuit breaker closed after successful probe")
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error):
+        """Count a failed call and open the breaker if the threshold is reached"""
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+class ProviderClient:
+    """HTTP client for a payment provider with a timeout and a circuit breaker"""
+    def __init__(self, name, timeout, failure_threshold=PROVIDER_FAILURE_THRESHOLD,
+                 reset_timeout=PROVIDER_RESET_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session = requests.Session()
+
+    @property
+    def is_available(self):
+        """False while the breaker is open"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the breaker
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL
+            **kwargs: Passed to requests
+
+        Returns:
+            requests.Response: Provider response (4xx responses are returned as is)
+
+        Raises:
+            ProviderUnavailable: If the breaker is open or the request failed
+        """
+        if not self.breaker.allow_request():
+            PROVIDER_REQUESTS.inc(provider=self.name, status='rejected')
+            raise ProviderUnavailable(f"{self.name} circuit is open")
+
+        kwargs.setdefault('timeout', self.timeout)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            PROVIDER_REQUESTS.inc(provider=self.name, status='error')
+            PROVIDER_LATENCY.observe(time.perf_counter() - started, provider=self.name, status='error')
+            self.breaker.record_failure(e)
+            logger.warning(f"{self.name} request failed: {e}")
+            raise ProviderUnavailable(f"{self.name} request failed: {e}") from e
+
+        PROVIDER_REQUESTS.inc(provider=self.name, status=response.status_code)
+        PROVIDER_LATENCY.observe(time.perf_counter() - started, provider=self.name, status=response.status_code)
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+# Shared clients, one per provider
+wix_client = ProviderClient('wix', WIX_TIMEOUT)
+ainox_client = ProviderClient('ainox', AINOX_TIMEOUT)
+
+PROVIDER_CLIENTS = {
+    'wix': wix_client,
+    'ainox': ainox_client
+}
+
+def providers_available():
+    """Check if every provider breaker accepts requests"""
+    return all(client.is_available for client in PROVIDER_CLIENTS.values())
+
+def seconds_until_providers_retry():
+    """Return the longest wait until all open breakers allow a probe"""
+    return max(client.breaker.seconds_until_retry() for client in PROVIDER_CLIENTS.values())
+
+def get_breaker_report():
+    """
+    Build a human readable breaker status report
+
+    Returns:
+        str: One line per provider
+    """
+    lines = []
+    for name, client in PROVIDER_CLIENTS.items():
+        breaker = client.breaker
+        line = f"{name}: {breaker.state}, ошибок подряд: {breaker.failures}, таймаут: {client.timeout}с"
+        retry_in = breaker.seconds_until_retry()
+        if retry_in:
+            line += f", повтор через {int(retry_in)}с"
+        if breaker.last_error:
+            line += f"\n  последняя ошибка: {breaker.last_error}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,153 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import N_PLUS_ONE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Unit of work (update or job) the current task is executing
+_current_unit = ContextVar('query_profiler_unit', default=None)
+
+_enabled = False
+_lock = threading.Lock()
+_unit_totals = {}
+_repeated_statements = {}
+
+class UnitOfWork:
+    """DB usage collected for a single update or job"""
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.sessions = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+def _normalize(statement):
+    return re.sub(r'\s+', ' ', statement).strip()
+
+@contextmanager
+def profile_unit(name):
+    """
+    Collect DB usage of the code inside the block as one unit of work
+
+    Nested blocks are counted in the outermost unit. Does nothing while profiling is disabled.
+
+    Args:
+        name (str): Handler or job name used to group results
+    """
+    if not _enabled or _current_unit.get() is not None:
+        yield
+        return
+
+    unit = UnitOfWork(name)
+    token = _current_unit.set(unit)
+    try:
+        yield
+    finally:
+        _current_unit.reset(token)
+        _record_unit(unit)
+
+def _record_unit(unit):
+    with _lock:
+        totals = _unit_totals.setdefault(unit.name, {
+            'runs': 0, 'queries': 0, 'sessions': 0, 'db_time': 0.0, 'max_queries': 0
+        })
+        totals['runs'] += 1
+        totals['queries'] += unit.queries
+        totals['sessions'] += unit.sessions
+        totals['db_time'] += unit.db_time
+        totals['max_queries'] = max(totals['max_queries'], unit.queries)
+
+        for statement, count in unit.statements.items():
+            if count < N_PLUS_ONE_THRESHOLD:
+                continue
+            offender = _repeated_statements.setdefault((unit.name, statement), {'units': 0, 'executions': 0, 'max_repeats': 0})
+            offender['units'] += 1
+            offender['executions'] += count
+            offender['max_repeats'] = max(offender['max_repeats'], count)
+            if offender['units'] == 1:
+                logger.warning(f"Possible N+1 in {unit.name}: statement repeated {count} times: {statement[:200]}")
+
+def enable_query_profiling(engine, session_factory):
+    """
+    Attach the profiler to the engine and session factory
+
+    Args:
+        engine (Engine): SQLAlchemy engine to count queries on
+        session_factory (sessionmaker): Session factory to count sessions on
+    """
+    global _enabled
+    from sqlalchemy import event
+
+    if _enabled:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_unit.get() is not None:
+            conn.info.setdefault('profiler_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        unit = _current_unit.get()
+        if unit is None or not conn.info.get('profiler_start_time'):
+            return
+        unit.db_time += time.perf_counter() - conn.info['profiler_start_time'].pop()
+        unit.queries += 1
+        unit.statements[_normalize(statement)] += 1
+
+    @event.listens_for(session_factory, 'after_begin')
+    def after_begin(session, transaction, connection):
+        unit = _current_unit.get()
+        if unit is not None:
+            unit.sessions += 1
+
+    _enabled = True
+    logger.info("Query profiling enabled")
+
+def reset_profile():
+    """Drop all collected profiling data"""
+    with _lock:
+        _unit_totals.clear()
+        _repeated_statements.clear()
+
+def get_profile_report(limit=5):
+    """
+    Build a report of the heaviest units of work and the most repeated statements
+
+    Args:
+        limit (int): Number of entries per section
+
+    Returns:
+        str: Human readable report
+    """
+    if not _enabled:
+        return "Профилирование запросов выключено (QUERY_PROFILING=1)."
+
+    with _lock:
+        units = sorted(_unit_totals.items(), key=lambda item: item[1]['queries'] / item[1]['runs'], reverse=True)
+        offenders = sorted(_repeated_statements.items(), key=lambda item: item[1]['executions'], reverse=True)
+
+    lines = ["Запросы к БД по обработчикам (в среднем на запуск):"]
+    for name, totals in units[:limit]:
+        runs = totals['runs']
+        lines.append(
+            f"{name}: запусков {runs}, запросов {totals['queries'] / runs:.1f} (макс. {totals['max_queries']}), "
+            f"сессий {totals['sessions'] / runs:.1f}, время БД {totals['db_time'] / runs * 1000:.1f} мс"
+        )
+
+    lines.append("")
+    lines.append(f"Повторяющиеся запросы (N+1, от {N_PLUS_ONE_THRESHOLD} раз за запуск):")
+    if not offenders:
+        lines.append("не найдено")
+    for (name, statement), offender in offenders[:limit]:
+        lines.append(
+            f"{name}: {offender['executions']} выполнений в {offender['units']} запусках, "
+            f"макс. {offender['max_repeats']} за запуск\n  {statement[:150]}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,101 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+class TokenBucket:
+    """
+    Async token bucket shared by the coroutines sending requests to Telegram
+
+    Allows bursts of up to `capacity` calls and `rate` calls per second on
+    average. A flood control answer pauses every caller of the bucket, not only
+    the one that received it.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a call is allowed"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def is_idle(self, seconds):
+        """Check if the bucket has not been used for `seconds`"""
+        return time.monotonic() - self._updated > seconds
+
+    def pause(self, seconds):
+        """Block all callers for `seconds`, e.g. after a RetryAfter error"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        # Start refilling from an empty bucket once the pause is over
+        self._tokens = 0
+        self._updated = self._paused_until
+
+def retry_after_seconds(error):
+    """Return the wait requested by a telegram.error.RetryAfter as float seconds"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    Token bucket handing out calls in priority order
+
+    Waiting callers are served lowest priority value first, then in arrival
+    order, so a backlog of low priority calls never delays a high priority one
+    by more than one token.
+    """
+    def __init__(self, rate, capacity=None):
+        super().__init__(rate, capacity)
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = asyncio.Condition()
+
+    def waiting(self):
+        """Number of callers waiting for a token"""
+        return len(self._waiting)
+
+    async def acquire(self, priority=0):
+        """Wait until a call with the given priority is allowed"""
+        entry = (priority, next(self._sequence))
+        async with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == entry:
+                        now = time.monotonic()
+                        if now < self._paused_until:
+                            timeout = self._paused_until - now
+                        else:
+                            self._refill(now)
+                            if self._tokens >= 1:
+                                self._tokens -= 1
+                                return
+                            timeout = (1 - self._tokens) / self.rate
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
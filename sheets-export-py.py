@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import traceback
+
+from sqlalchemy import or_
+
+from models import User, SheetExportRow, Session
+from config import CREDENTIALS_PATH, SHEET_EXPORT_CHUNK_SIZE
+from modules.metrics import instrument_handler
+from modules.tenants import get_tenants, current_tenant, current_tenant_id, tenant_scope
+
+logger = logging.getLogger(__name__)
+
+HEADER = ['Telegram ID', 'Username', 'Имя', 'Фамилия', 'Email', 'Статус', 'Дата окончания', 'Российская карта']
+FIRST_DATA_ROW = 2
+
+_export_locks = {}
+_export_locks_guard = threading.Lock()
+
+def is_sheet_configured(tenant=None):
+    """Check if a real sheet ID is configured for the tenant (the current one by default)"""
+    sheet_id = (tenant or current_tenant()).sheet_id
+    return bool(sheet_id) and sheet_id != "your_google_sheet_id"
+
+def get_worksheet():
+    """Open the first worksheet of the current tenant's sheet (gspread is only imported when an export runs)"""
+    import gspread
+
+    client = gspread.service_account(filename=CREDENTIALS_PATH)
+    return client.open_by_key(current_tenant().sheet_id).sheet1
+
+def _column_letter(index):
+    """Convert a 1-based column index to a sheet column letter"""
+    letters = ''
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+LAST_COLUMN = _column_letter(len(HEADER))
+
+def user_row(user):
+    """Build the sheet row for a user"""
+    return [
+        str(user.telegram_id),
+        user.username or '',
+        user.first_name or '',
+        user.last_name or '',
+        user.email or '',
+        user.subscription_status or 'none',
+        user.subscription_end_date.strftime('%d.%m.%Y') if user.subscription_end_date else '',
+        'да' if user.is_russian_card else 'нет'
+    ]
+
+def _row_hash(row):
+    return hashlib.md5('\x1f'.join(row).encode()).hexdigest()
+
+def _row_range(row_number):
+    return f"A{row_number}:{LAST_COLUMN}{row_number}"
+
+def reset_export_snapshot():
+    """Forget what was exported so the next export rewrites every row"""
+    db_session = Session()
+    try:
+        db_session.query(SheetExportRow).delete()
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def _export_lock(tenant_id):
+    """Lock serializing the exports of a tenant within this process"""
+    with _export_locks_guard:
+        return _export_locks.setdefault(tenant_id, threading.Lock())
+
+def export_subscriptions(worksheet=None, chunk_size=SHEET_EXPORT_CHUNK_SIZE, full=False):
+    """
+    Mirror the users subscription table into the sheet
+
+    Only rows that changed since the previous export are written. Each user keeps
+    the sheet row assigned on first export, new users are appended and rows of
+    deleted users are blanked. Changes go out as one batch_update call per chunk
+    and the snapshot is saved after each chunk, so an interrupted export resumes
+    where it stopped.
+
+    A full export forgets the snapshot, rewrites every row from the top and clears
+    the rows below the last one written. Exports of a tenant in this process run
+    one at a time, so the scheduled export and /export_sheet never assign the same
+    new rows twice.
+
+    Args:
+        worksheet: gspread Worksheet or a compatible fake, opened from the current tenant's sheet by default
+        chunk_size (int): Rows per batch_update call
+        full (bool): Rewrite the whole sheet instead of the changed rows
+
+    Returns:
+        dict: Counts of users, changed rows, cleared rows and API calls
+    """
+    if worksheet is None:
+        worksheet = get_worksheet()
+
+    with _export_lock(current_tenant_id()):
+        if full:
+            reset_export_snapshot()
+        return _export_changes(worksheet, chunk_size, full)
+
+def _export_changes(worksheet, chunk_size, full):
+    db_session = Session()
+    try:
+        snapshot = {
+            row.telegram_id: (row.row_number, row.row_hash)
+            for row in db_session.query(SheetExportRow)
+        }
+        next_row = max((row_number for row_number, _ in snapshot.values()), default=FIRST_DATA_ROW - 1) + 1
+
+        # (action, telegram_id, row_number, row_hash, values)
+        changes = []
+        if not snapshot:
+            changes.append(('header', None, 1, None, HEADER))
+
+        seen = set()
+        users = db_session.query(User).order_by(User.id).yield_per(1000)
+        for user in users:
+            seen.add(user.telegram_id)
+            row = user_row(user)
+            row_hash = _row_hash(row)
+            previous = snapshot.get(user.telegram_id)
+            if previous and previous[1] == row_hash:
+                continue
+            if previous:
+                changes.append(('update', user.telegram_id, previous[0], row_hash, row))
+            else:
+                changes.append(('insert', user.telegram_id, next_row, row_hash, row))
+                next_row += 1
+
+        cleared = 0
+        for telegram_id, (row_number, _) in snapshot.items():
+            if telegram_id not in seen:
+                changes.append(('delete', telegram_id, row_number, None, [''] * len(HEADER)))
+                cleared += 1
+
+        needed_rows = max([change[2] for change in changes], default=0)
+        if needed_rows > worksheet.row_count:
+            worksheet.add_rows(needed_rows - worksheet.row_count)
+
+        api_calls = 0
+        for start in range(0, len(changes), chunk_size):
+            chunk = changes[start:start + chunk_size]
+            worksheet.batch_update(
+                [{'range': _row_range(row_number), 'values': [values]} for _, _, row_number, _, values in chunk],
+                value_input_option='RAW'
+            )
+            api_calls += 1
+
+            mappings = {'insert': [], 'update': [], 'delete': []}
+            tenant_id = current_tenant_id()
+            for action, telegram_id, row_number, row_hash, _ in chunk:
+                if action in mappings:
+                    mappings[action].append({
+                        'tenant_id': tenant_id, 'telegram_id': telegram_id, 'row_number': row_number, 'row_hash': row_hash
+                    })
+            if mappings['insert']:
+                # A run in another process may have saved these users or rows meanwhile; this run's rows win
+                db_session.query(SheetExportRow).filter(or_(
+                    SheetExportRow.telegram_id.in_([mapping['telegram_id'] for mapping in mappings['insert']]),
+                    SheetExportRow.row_number.in_([mapping['row_number'] for mapping in mappings['insert']])
+                )).delete(synchronize_session=False)
+            db_session.bulk_insert_mappings(SheetExportRow, mappings['insert'])
+            db_session.bulk_update_mappings(SheetExportRow, mappings['update'])
+            if mappings['delete']:
+                deleted_ids = [mapping['telegram_id'] for mapping in mappings['delete']]
+                db_session.query(SheetExportRow).filter(SheetExportRow.telegram_id.in_(deleted_ids)).delete(synchronize_session=False)
+            db_session.commit()
+
+        # Rows below the rewritten table still hold the old contents
+        if full and next_row <= worksheet.row_count:
+            worksheet.batch_clear([f"A{next_row}:{LAST_COLUMN}{worksheet.row_count}"])
+            api_calls += 1
+
+        stats = {
+            'users': len(seen),
+            'changed': len(changes) - cleared - (1 if not snapshot else 0),
+            'cleared': cleared,
+            'api_calls': api_calls
+        }
+        logger.info(f"Sheet export completed: {stats}")
+        return stats
+    finally:
+        db_session.close()
+
+@instrument_handler
+async def schedule_sheet_export(context):
+    """Job queue callback for the periodic sheet export of every tenant with a sheet"""
+    for tenant in get_tenants():
+        if not is_sheet_configured(tenant):
+            continue
+        with tenant_scope(tenant):
+            try:
+                # gspread and DB calls block; keep the bots' event loop free meanwhile
+                await asyncio.to_thread(export_subscriptions)
+            except Exception as e:
+                logger.error(f"Sheet export for tenant {tenant.id} failed: {e}")
+                logger.error(traceback.format_exc())
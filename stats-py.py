@@ -0,0 +1,148 @@
+import logging
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import func
+
+from models import User, DailyStats, Session
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('active', 'expired', 'none')
+
+def get_subscription_stats(db_session, expiring_days=7, now=None):
+    """
+    Aggregate subscription counts in the database
+
+    Uses one GROUP BY over status and card type and one count of upcoming
+    expirations, so the cost does not depend on loading users into Python.
+
+    Args:
+        db_session (Session): Database session
+        expiring_days (int): Window for the "expiring soon" count
+        now (datetime): Reference time, defaults to the current time
+
+    Returns:
+        dict: Counts per status, expiring soon and card split of active subscriptions
+    """
+    now = now or datetime.now()
+    stats = {
+        'total': 0,
+        'active': 0,
+        'expired': 0,
+        'none': 0,
+        'expiring_soon': 0,
+        'russian_card': 0,
+        'international_card': 0
+    }
+
+    rows = db_session.query(
+        User.subscription_status, User.is_russian_card, func.count(User.id)
+    ).group_by(User.subscription_status, User.is_russian_card).all()
+
+    for status, is_russian_card, count in rows:
+        status = status if status in STATUSES else 'none'
+        stats['total'] += count
+        stats[status] += count
+        if status == 'active':
+            stats['russian_card' if is_russian_card else 'international_card'] += count
+
+    stats['expiring_soon'] = db_session.query(User).filter(
+        User.subscription_status == 'active',
+        User.subscription_end_date >= now,
+        User.subscription_end_date <= now + timedelta(days=expiring_days)
+    ).count()
+
+    return stats
+
+def record_daily_snapshot(db_session, day=None):
+    """
+    Store today's subscription counts in the daily_stats table
+
+    Running it again on the same day overwrites that day's row.
+
+    Args:
+        db_session (Session): Database session, committed by the caller
+        day (date): Snapshot date, defaults to today
+
+    Returns:
+        DailyStats: The stored snapshot
+    """
+    day = day or date.today()
+    stats = get_subscription_stats(db_session)
+
+    snapshot = db_session.query(DailyStats).filter_by(day=day).first()
+    if not snapshot:
+        snapshot = DailyStats(day=day)
+        db_session.add(snapshot)
+
+    snapshot.total = stats['total']
+    snapshot.active = stats['active']
+    snapshot.expired = stats['expired']
+    snapshot.no_subscription = stats['none']
+    snapshot.expiring_soon = stats['expiring_soon']
+    snapshot.russian_card = stats['russian_card']
+    snapshot.international_card = stats['international_card']
+    snapshot.created_at = datetime.now()
+
+    logger.info(f"Daily stats snapshot for {day}: {stats}")
+    return snapshot
+
+def get_stats_trend(db_session, days=7):
+    """
+    Return the latest daily snapshots, oldest first
+
+    Args:
+        db_session (Session): Database session
+        days (int): Number of days to return
+
+    Returns:
+        list: DailyStats rows
+    """
+    since = date.today() - timedelta(days=days - 1)
+    return db_session.query(DailyStats).filter(DailyStats.day >= since).order_by(DailyStats.day).all()
+
+def _delta(current, previous):
+    difference = current - previous
+    return f"{difference:+d}" if difference else "0"
+
+def format_stats_report(expiring_days=7, trend_days=7):
+    """
+    Build the /stats report
+
+    Args:
+        expiring_days (int): Window for the "expiring soon" count
+        trend_days (int): Number of daily snapshots to show
+
+    Returns:
+        str: Human readable report
+    """
+    db_session = Session()
+    try:
+        stats = get_subscription_stats(db_session, expiring_days)
+        trend = get_stats_trend(db_session, trend_days)
+    finally:
+        db_session.close()
+
+    lines = [
+        f"Всего пользователей: {stats['total']}",
+        f"Активные подписки: {stats['active']}",
+        f"Истекшие подписки: {stats['expired']}",
+        f"Без подписки: {stats['none']}",
+        f"Истекают в ближайшие {expiring_days} дн.: {stats['expiring_soon']}",
+        f"Активные по картам: российские {stats['russian_card']}, международные {stats['international_card']}"
+    ]
+
+    lines.append("")
+    if not trend:
+        lines.append("Ежедневной статистики пока нет (заполняется задачей напоминаний).")
+        return "\n".join(lines)
+
+    lines.append(f"Динамика за {trend_days} дн. (активные / истекшие / всего):")
+    previous = None
+    for snapshot in trend:
+        line = f"{snapshot.day.strftime('%d.%m')}: {snapshot.active} / {snapshot.expired} / {snapshot.total}"
+        if previous:
+            line += f" ({_delta(snapshot.active, previous.active)} активных)"
+        lines.append(line)
+        previous = snapshot
+    return "\n".join(lines)
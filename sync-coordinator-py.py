@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from models import SyncLease, Session
+from config import SYNC_LEASE_TTL
+from modules.payment_integration import sync_subscriptions_blocking
+from modules.metrics import instrument_handler, SYNC_REQUESTS
+from modules.tenants import get_tenants, current_tenant, tenant_scope
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = 'subscriptions'
+
+# Identifies this process as the lease holder
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_coordinators = {}
+
+def acquire_sync_lease(run_id, ttl=SYNC_LEASE_TTL):
+    """
+    Take the current tenant's sync lease unless another process holds it
+
+    An expired lease is taken over with a conditional update, a missing one is
+    inserted; in both cases the database decides which process wins.
+
+    Args:
+        run_id (str): ID of the run taking the lease
+        ttl (int): Seconds until the lease expires if it is never released
+
+    Returns:
+        bool: True if the lease was acquired
+    """
+    db_session = Session()
+    try:
+        now = datetime.now()
+        lease = {'run_id': run_id, 'owner': OWNER, 'acquired_at': now, 'expires_at': now + timedelta(seconds=ttl)}
+        taken = db_session.query(SyncLease).filter(
+            SyncLease.name == LEASE_NAME,
+            SyncLease.expires_at < now
+        ).update(lease, synchronize_session=False)
+        db_session.commit()
+        if taken:
+            return True
+
+        try:
+            db_session.add(SyncLease(name=LEASE_NAME, **lease))
+            db_session.commit()
+            return True
+        except IntegrityError:
+            # Held by another run that has not expired yet
+            db_session.rollback()
+            return False
+    finally:
+        db_session.close()
+
+def renew_sync_lease(run_id, ttl=SYNC_LEASE_TTL):
+    """
+    Extend the lease held by a run
+
+    Returns:
+        bool: False if the run no longer holds the lease
+    """
+    db_session = Session()
+    try:
+        renewed = db_session.query(SyncLease).filter_by(name=LEASE_NAME, run_id=run_id).update(
+            {'expires_at': datetime.now() + timedelta(seconds=ttl)}, synchronize_session=False
+        )
+        db_session.commit()
+        return bool(renewed)
+    finally:
+        db_session.close()
+
+def release_sync_lease(run_id):
+    """Release the sync lease if it is still held by this run"""
+    db_session = Session()
+    try:
+        db_session.query(SyncLease).filter_by(name=LEASE_NAME, run_id=run_id).delete(synchronize_session=False)
+        db_session.commit()
+    finally:
+        db_session.close()
+
+def get_sync_lease():
+    """Return the current tenant's sync lease as a dict, or None if no sync is running"""
+    db_session = Session()
+    try:
+        lease = db_session.query(SyncLease).filter(
+            SyncLease.name == LEASE_NAME,
+            SyncLease.expires_at >= datetime.now()
+        ).first()
+        if not lease:
+            return None
+        return {'run_id': lease.run_id, 'owner': lease.owner, 'acquired_at': lease.acquired_at.isoformat()}
+    finally:
+        db_session.close()
+
+def _merge_full(first, second):
+    # A forced full sync wins over automatic (None), automatic over forced incremental
+    if first is True or second is True:
+        return True
+    if first is None or second is None:
+        return None
+    return False
+
+class SyncCoordinator:
+    """
+    Single-flight guard for the subscription sync of one tenant
+
+    A request arriving while a sync runs in this process attaches to that run
+    and gets its result. A request the running sync does not cover (a full sync
+    while an incremental one runs) is queued; all queued requests merge into
+    one follow-up run. Across processes the sync_leases table ensures only one
+    sync per tenant runs at a time; the lease is renewed every SYNC_LEASE_TTL / 3
+    seconds while the run lasts.
+
+    The sync itself runs in a thread, so the event loop keeps handling updates
+    (and the requests attaching to the run) meanwhile.
+    """
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self._running = None
+        self._running_full = None
+        self._follow_up = None
+        self._follow_up_full = None
+
+    async def sync(self, full=None):
+        """
+        Run a sync or attach to the one in progress
+
+        Args:
+            full (bool): Force a full (True) or incremental (False) sync, None decides per provider
+
+        Returns:
+            dict: Sync stats with the `run_id` they belong to. `joined` is set when the
+                request attached to a run started by another caller, `locked` when another
+                process holds the lease and nothing was synced.
+        """
+        if self._follow_up is not None:
+            # A follow-up is already queued, it covers this request too
+            self._follow_up_full = _merge_full(self._follow_up_full, full)
+            SYNC_REQUESTS.inc(outcome='queued')
+            return dict(await asyncio.shield(self._follow_up), joined=True)
+
+        if self._running is not None and not self._running.done():
+            if not full or self._running_full:
+                SYNC_REQUESTS.inc(outcome='joined')
+                return dict(await asyncio.shield(self._running), joined=True)
+            self._follow_up_full = full
+            self._follow_up = asyncio.get_running_loop().create_task(self._run_after_current())
+            SYNC_REQUESTS.inc(outcome='queued')
+            return await asyncio.shield(self._follow_up)
+
+        SYNC_REQUESTS.inc(outcome='started')
+        return await asyncio.shield(self._start(full))
+
+    def _start(self, full):
+        self._running_full = full
+        self._running = asyncio.get_running_loop().create_task(self._run(full, uuid.uuid4().hex[:12]))
+        return self._running
+
+    async def _run_after_current(self):
+        try:
+            await self._running
+        except Exception:
+            # The failed run was reported to its own callers
+            pass
+        # Requests arriving from now on attach to the follow-up run itself
+        full, self._follow_up = self._follow_up_full, None
+        return await self._start(full)
+
+    async def _run(self, full, run_id):
+        with tenant_scope(self.tenant):
+            if not acquire_sync_lease(run_id):
+                lease = get_sync_lease() or {}
+                SYNC_REQUESTS.inc(outcome='locked')
+                logger.info(f"Sync for tenant {self.tenant.id} skipped, run {lease.get('run_id')} holds the lease on {lease.get('owner')}")
+                return {'run_id': lease.get('run_id'), 'locked': True, 'owner': lease.get('owner')}
+
+            logger.info(f"Sync run {run_id} started for tenant {self.tenant.id} (full={full})")
+            heartbeat = asyncio.get_running_loop().create_task(self._renew_lease(run_id))
+            try:
+                # to_thread copies the context, so the sync runs in this tenant's scope
+                stats = await asyncio.to_thread(sync_subscriptions_blocking, full)
+            finally:
+                heartbeat.cancel()
+                release_sync_lease(run_id)
+        stats['run_id'] = run_id
+        return stats
+
+    async def _renew_lease(self, run_id):
+        while True:
+            await asyncio.sleep(SYNC_LEASE_TTL / 3)
+            if not await asyncio.to_thread(renew_sync_lease, run_id):
+                logger.warning(f"Sync run {run_id} for tenant {self.tenant.id} lost its lease")
+                return
+
+def get_sync_coordinator(tenant=None):
+    """Return the coordinator of a tenant, the current one by default"""
+    tenant = tenant or current_tenant()
+    if tenant.id not in _coordinators:
+        _coordinators[tenant.id] = SyncCoordinator(tenant)
+    return _coordinators[tenant.id]
+
+async def request_sync(full=None):
+    """Sync the current tenant through its coordinator, see SyncCoordinator.sync"""
+    return await get_sync_coordinator().sync(full)
+
+# Function to be called from the main bot
+@instrument_handler
+async def schedule_subscription_sync(context):
+    """Function to be called by the job queue, syncs every tenant in turn over the shared provider pools"""
+    for tenant in get_tenants():
+        try:
+            await get_sync_coordinator(tenant).sync()
+        except Exception as e:
+            logger.error(f"Subscription sync for tenant {tenant.id} failed: {e}")
+            logger.error(traceback.format_exc())
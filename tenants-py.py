@@ -0,0 +1,107 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config import (
+    TENANTS_FILE, BOT_TOKEN, GROUP_ID, ADMIN_IDS,
+    WIX_API_KEY, WIX_SITE_ID, AINOX_LOGIN, AINOX_KEY, SHEET_ID
+)
+
+logger = logging.getLogger(__name__)
+
+# Tenant owning the rows that existed before multi-tenant mode
+DEFAULT_TENANT_ID = 'default'
+
+# Tenant whose update, job or sync the current task is handling
+_current_tenant = ContextVar('current_tenant', default=None)
+
+_tenants = None
+
+class Tenant:
+    """Bot, group and provider credentials of one community"""
+    def __init__(self, tenant_id, bot_token, group_id, admin_ids,
+                 wix_api_key=WIX_API_KEY, wix_site_id=WIX_SITE_ID,
+                 ainox_login=AINOX_LOGIN, ainox_key=AINOX_KEY, sheet_id=SHEET_ID):
+        self.id = tenant_id
+        self.bot_token = bot_token
+        self.group_id = int(group_id)
+        self.admin_ids = [int(admin_id) for admin_id in admin_ids]
+        self.wix_api_key = wix_api_key
+        self.wix_site_id = wix_site_id
+        self.ainox_login = ainox_login
+        self.ainox_key = ainox_key
+        self.sheet_id = sheet_id
+
+    @property
+    def ainox_headers(self):
+        return {'api-login': self.ainox_login, 'api-key': self.ainox_key}
+
+    def __repr__(self):
+        return f"<Tenant(id='{self.id}', group_id={self.group_id})>"
+
+def load_tenants(path=TENANTS_FILE):
+    """
+    Load tenant configs from TENANTS_FILE
+
+    The file holds a JSON list of objects with `id`, `bot_token`, `group_id` and
+    `admin_ids`, plus optional `wix_api_key`, `wix_site_id`, `ainox_login`,
+    `ainox_key` and `sheet_id` that default to the values from the environment.
+    Without TENANTS_FILE the bot runs a single tenant configured from the environment.
+
+    Returns:
+        list: Tenant objects
+    """
+    if not path:
+        return [Tenant(DEFAULT_TENANT_ID, BOT_TOKEN, GROUP_ID, ADMIN_IDS)]
+
+    with open(path) as f:
+        entries = json.load(f)
+
+    tenants = []
+    for entry in entries:
+        entry = dict(entry)
+        tenants.append(Tenant(entry.pop('id'), entry.pop('bot_token'), entry.pop('group_id'), entry.pop('admin_ids'), **entry))
+
+    ids = [tenant.id for tenant in tenants]
+    if not tenants or len(set(ids)) != len(ids):
+        raise ValueError(f"{path} must list tenants with unique ids, got {ids}")
+    logger.info(f"Loaded {len(tenants)} tenants: {', '.join(ids)}")
+    return tenants
+
+def get_tenants():
+    """Return all configured tenants, loading them on first use"""
+    global _tenants
+    if _tenants is None:
+        _tenants = load_tenants()
+    return _tenants
+
+def get_tenant(tenant_id):
+    for tenant in get_tenants():
+        if tenant.id == tenant_id:
+            return tenant
+    raise KeyError(f"Unknown tenant: {tenant_id}")
+
+def current_tenant():
+    """Tenant of the current task, the default tenant outside any tenant scope"""
+    tenant = _current_tenant.get()
+    if tenant is not None:
+        return tenant
+    tenants = get_tenants()
+    return next((tenant for tenant in tenants if tenant.id == DEFAULT_TENANT_ID), tenants[0])
+
+def current_tenant_id():
+    return current_tenant().id
+
+def set_current_tenant(tenant):
+    """Bind a tenant to the current task and the tasks it creates from now on"""
+    _current_tenant.set(tenant)
+
+@contextmanager
+def tenant_scope(tenant):
+    """Run the code inside the block on behalf of a tenant"""
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
@@ -0,0 +1,45 @@
+"""
+Tests for the provider subscription sync
+
+Provider HTTP calls are answered by stand-ins and the session factory is bound
+to a throwaway SQLite database. Run with `python -m pytest tests`.
+"""
+
+from sqlalchemy import create_engine
+
+import models
+from modules import payment_integration
+from modules.metrics import SYNC_LAST_SUCCESS
+from modules.tenants import Tenant, tenant_scope
+
+class ErrorResponse:
+    """Response of a provider that fails the request"""
+    status_code = 500
+    text = 'Internal Server Error'
+
+    def json(self):
+        return {}
+
+class ErrorClient:
+    def get(self, *args, **kwargs):
+        return ErrorResponse()
+
+    def post(self, *args, **kwargs):
+        return ErrorResponse()
+
+def test_failed_list_request_keeps_sync_state(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    models.Base.metadata.create_all(engine)
+    monkeypatch.setitem(models.Session.kw, 'bind', engine)
+    monkeypatch.setattr(payment_integration, 'wix_client', ErrorClient())
+    monkeypatch.setattr(payment_integration, 'ainox_client', ErrorClient())
+    monkeypatch.setattr(SYNC_LAST_SUCCESS, '_values', {})
+
+    with tenant_scope(Tenant('test', '123456:TEST', -1001234567890, [1])):
+        stats = payment_integration.sync_subscriptions_blocking(full=True)
+        states = models.Session().query(models.SyncState).all()
+
+    assert stats['wix']['unavailable'] and stats['ainox']['unavailable']
+    # Neither the full sync time nor the success timestamp may advance
+    assert states == []
+    assert SYNC_LAST_SUCCESS._values == {}
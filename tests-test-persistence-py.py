@@ -0,0 +1,53 @@
+"""
+Tests for SQLPersistence
+
+The session factory is bound to a throwaway SQLite database, so entries go
+through the real write and load paths. Run with `python -m pytest tests`.
+"""
+
+import asyncio
+
+from sqlalchemy import create_engine
+
+import models
+from modules.persistence import SQLPersistence
+from modules.tenants import Tenant
+
+def make_persistence(monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'persistence.db'}")
+    models.Base.metadata.create_all(engine)
+    monkeypatch.setitem(models.Session.kw, 'bind', engine)
+    return Tenant('test', '123456:TEST', -1001234567890, [1])
+
+def test_conversation_survives_restart(monkeypatch, tmp_path):
+    tenant = make_persistence(monkeypatch, tmp_path)
+
+    async def write():
+        persistence = SQLPersistence(tenant)
+        await persistence.update_conversation('link_email', (1000, 1000), 1)
+        await persistence.update_user_data(1000, {'email': 'user@example.com'})
+        await persistence.flush()
+
+    async def restart():
+        # A fresh instance has nothing cached and reads everything back from the database
+        persistence = SQLPersistence(tenant)
+        return await persistence.get_conversations('link_email'), await persistence.get_user_data()
+
+    asyncio.run(write())
+    conversations, user_data = asyncio.run(restart())
+
+    assert conversations == {(1000, 1000): 1}
+    assert user_data == {1000: {'email': 'user@example.com'}}
+
+def test_ended_conversation_is_removed(monkeypatch, tmp_path):
+    tenant = make_persistence(monkeypatch, tmp_path)
+
+    async def scenario():
+        persistence = SQLPersistence(tenant)
+        await persistence.update_conversation('link_email', (1000, 1000), 1)
+        await persistence.flush()
+        await persistence.update_conversation('link_email', (1000, 1000), None)
+        await persistence.flush()
+        return await SQLPersistence(tenant).get_conversations('link_email')
+
+    assert asyncio.run(scenario()) == {}
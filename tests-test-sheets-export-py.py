@@ -0,0 +1,71 @@
+"""
+Tests for the Google Sheets export
+
+Exports run against the in-memory FakeWorksheet from the benchmarks and a
+throwaway SQLite database. Run with `python -m pytest tests`.
+"""
+
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+import models
+from benchmarks.fake_sheets import FakeWorksheet
+from modules.sheets_export import export_subscriptions, user_row
+from modules.tenants import Tenant, tenant_scope
+
+TENANT = Tenant('test', '123456:TEST', -1001234567890, [1])
+
+class SlowWorksheet(FakeWorksheet):
+    """FakeWorksheet whose writes take long enough for exports to overlap"""
+    def batch_update(self, data, **kwargs):
+        time.sleep(0.05)
+        return super().batch_update(data, **kwargs)
+
+def setup_users(monkeypatch, tmp_path, count):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sheets.db'}")
+    models.Base.metadata.create_all(engine)
+    monkeypatch.setitem(models.Session.kw, 'bind', engine)
+    with tenant_scope(TENANT):
+        db_session = models.Session()
+        db_session.add_all(models.User(telegram_id=1000 + index, username=f"user{index}") for index in range(count))
+        db_session.commit()
+        db_session.close()
+
+def test_full_export_clears_rows_below_the_table(monkeypatch, tmp_path):
+    setup_users(monkeypatch, tmp_path, 3)
+    worksheet = FakeWorksheet(rows=20)
+    # Left over from an earlier, longer table or typed in by hand
+    worksheet.batch_update([{'range': 'A10:B10', 'values': [['stale', 'row']]}])
+
+    with tenant_scope(TENANT):
+        export_subscriptions(worksheet, full=True)
+        users = models.Session().query(models.User).order_by(models.User.id).all()
+
+    assert worksheet.row_values(10) == []
+    assert [worksheet.row_values(row) for row in (2, 3, 4)] == [user_row(user) for user in users]
+
+def test_overlapping_exports_write_each_row_once(monkeypatch, tmp_path):
+    setup_users(monkeypatch, tmp_path, 5)
+    worksheet = SlowWorksheet(max_rows_per_call=2)
+    errors = []
+
+    def export():
+        with tenant_scope(TENANT):
+            try:
+                export_subscriptions(worksheet, chunk_size=2)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=export) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with tenant_scope(TENANT):
+        row_numbers = sorted(row.row_number for row in models.Session().query(models.SheetExportRow))
+
+    assert errors == []
+    assert row_numbers == [2, 3, 4, 5, 6]
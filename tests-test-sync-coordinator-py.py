@@ -0,0 +1,78 @@
+"""
+Tests for the single-flight sync coordinator
+
+The provider sync is replaced by a blocking stand-in and the DB lease by
+no-ops, so only the coalescing logic is exercised. Run with `python -m pytest tests`.
+"""
+
+import asyncio
+import time
+
+from modules import sync_coordinator
+from modules.sync_coordinator import SyncCoordinator
+from modules.tenants import Tenant
+
+def make_blocking_sync(calls, duration):
+    """Return a stand-in for sync_subscriptions_blocking that blocks like the real provider calls"""
+    def sync_subscriptions_blocking(full=None):
+        calls.append(full)
+        time.sleep(duration)
+        return {'wix': {}, 'ainox': {}, 'duration': duration}
+    return sync_subscriptions_blocking
+
+def make_coordinator(monkeypatch, calls, duration=0.3):
+    monkeypatch.setattr(sync_coordinator, 'sync_subscriptions_blocking', make_blocking_sync(calls, duration))
+    monkeypatch.setattr(sync_coordinator, 'acquire_sync_lease', lambda run_id, ttl=None: True)
+    monkeypatch.setattr(sync_coordinator, 'renew_sync_lease', lambda run_id, ttl=None: True)
+    monkeypatch.setattr(sync_coordinator, 'release_sync_lease', lambda run_id: None)
+    return SyncCoordinator(Tenant('test', '123456:TEST', -1001234567890, [1]))
+
+def test_staggered_request_joins_running_sync(monkeypatch):
+    calls = []
+    coordinator = make_coordinator(monkeypatch, calls)
+
+    async def scenario():
+        first = asyncio.create_task(coordinator.sync())
+        # Arrive while the first run is blocked in the provider calls
+        await asyncio.sleep(0.1)
+        second = await coordinator.sync()
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert calls == [None]
+    assert second['joined'] is True
+    assert second['run_id'] == first['run_id']
+    assert 'joined' not in first
+
+def test_full_requests_during_incremental_run_merge_into_one_follow_up(monkeypatch):
+    calls = []
+    coordinator = make_coordinator(monkeypatch, calls)
+
+    async def scenario():
+        incremental = asyncio.create_task(coordinator.sync(full=False))
+        await asyncio.sleep(0.1)
+        first_full = asyncio.create_task(coordinator.sync(full=True))
+        await asyncio.sleep(0.1)
+        second_full = asyncio.create_task(coordinator.sync(full=True))
+        return await asyncio.gather(incremental, first_full, second_full)
+
+    incremental, first_full, second_full = asyncio.run(scenario())
+
+    assert calls == [False, True]
+    assert first_full['run_id'] == second_full['run_id'] != incremental['run_id']
+    assert second_full['joined'] is True
+
+def test_request_after_run_finished_starts_new_run(monkeypatch):
+    calls = []
+    coordinator = make_coordinator(monkeypatch, calls, duration=0.05)
+
+    async def scenario():
+        first = await coordinator.sync()
+        second = await coordinator.sync()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert calls == [None, None]
+    assert first['run_id'] != second['run_id']
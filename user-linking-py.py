@@ -8,13 +8,14 @@ from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters,
 from models import User, Session
 from config import MESSAGES, EMAIL_INPUT, CONFIRM_EMAIL
 
-# Configure logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Import verification function
-from modules.payment_integration import verify_subscription_by_email
+from modules.payment_integration import verify_subscription_by_email, schedule_subscription_refresh, store_provider_ids
+from modules.provider_client import ProviderUnavailable
+from modules.metrics import instrument_handler
 
+@instrument_handler
 async def link_email_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the email linking process"""
     user_id = update.effective_user.id
@@ -57,6 +58,7 @@ async def link_email_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     finally:
         db_session.close()
 
+@instrument_handler
 async def email_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Process the email input"""
     email = update.message.text.strip()
@@ -89,6 +91,7 @@ async def email_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     
     return CONFIRM_EMAIL
 
+@instrument_handler
 async def button_callback_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Process button callbacks for email confirmation"""
     query = update.callback_query
@@ -128,6 +131,10 @@ async def button_callback_email(update: Update, context: ContextTypes.DEFAULT_TY
                 old_email = db_user.email
                 db_user.subscription_status = 'none'
                 db_user.subscription_end_date = None
+                # Provider IDs belonged to the old email
+                db_user.ainox_subscriber_id = None
+                db_user.wix_order_id = None
+                db_user.wix_contact_id = None
                 db_user.email = email
                 db_session.commit()
                 logger.info(f"Updated user {user_id} email from {old_email} to {email} and reset subscription")
@@ -154,6 +161,7 @@ async def button_callback_email(update: Update, context: ContextTypes.DEFAULT_TY
                         if subscription_info.get('end_date'):
                             db_user.subscription_end_date = subscription_info['end_date']
                         db_user.is_russian_card = subscription_info.get('payment_method') == 'russian'
+                        store_provider_ids(db_user, subscription_info)
                         db_session.commit()
                         
                         # Show success message with subscription info
@@ -165,6 +173,8 @@ async def button_callback_email(update: Update, context: ContextTypes.DEFAULT_TY
                 except Exception as e:
                     logger.error(f"Error verifying subscription: {e}")
                     logger.error(traceback.format_exc())
+                    if isinstance(e, ProviderUnavailable):
+                        schedule_subscription_refresh(context, user_id)
                     success_message = f"{MESSAGES['email_linked']}\n\nПроизошла ошибка при проверке статуса подписки. Используйте /status для проверки позже."
                 
                 # Send final message with result
@@ -243,6 +253,7 @@ async def button_callback_email(update: Update, context: ContextTypes.DEFAULT_TY
     
     return ConversationHandler.END
 
+@instrument_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the conversation."""
     logger.info("User canceled email linking")
@@ -263,6 +274,7 @@ def get_email_linking_handler():
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         name="email_linking",
+        persistent=True,  # In-flight linking survives restarts (see modules/persistence.py)
         conversation_timeout=300  # 5 minutes timeout
     )
     
@@ -2,8 +2,6 @@ import re
 import logging
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def validate_email(email):
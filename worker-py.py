@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Subscription Worker
+-------------------
+Standalone process that executes provider syncs and reminder batches queued
+in the `jobs` table. Run it next to bot.py with WORKER_MODE=external so the
+bot process only queues work and reads results. Several workers can run at
+once; each job is claimed by exactly one of them.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import traceback
+from contextlib import AsyncExitStack
+from types import SimpleNamespace
+
+from telegram.ext import ExtBot
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+from config import WORKER_POLL_INTERVAL, AUTO_MIGRATE, METRICS_HOST, WORKER_METRICS_PORT
+from models import engine, init_db
+from modules.metrics import instrument_engine, start_metrics_server
+from modules.job_store import claim_next_job, complete_job, fail_job
+from modules.sync_coordinator import request_sync
+from modules.handlers import send_reminders
+from modules.sheets_export import export_subscriptions, is_sheet_configured
+from modules.enforcement import run_enforcement
+from modules.outbound_queue import PriorityRateLimiter
+from modules.tenants import get_tenants, get_tenant, tenant_scope
+
+async def run_sync_job(bot, payload):
+    """Run a provider sync, incremental unless the payload asks for a full one"""
+    return await request_sync(full=(payload or {}).get('full'))
+
+async def run_reminders_job(bot, payload):
+    """Run the reminder batch with a bare bot context"""
+    await send_reminders(SimpleNamespace(bot=bot))
+    return None
+
+async def run_sheet_export_job(bot, payload):
+    """Mirror the subscription table into the Google Sheet"""
+    if not is_sheet_configured():
+        return None
+    return await asyncio.to_thread(export_subscriptions, full=bool((payload or {}).get('full')))
+
+async def run_enforcement_job(bot, payload):
+    """Ban or restrict expired users, dry run unless the payload or config says otherwise"""
+    dry_run = (payload or {}).get('dry_run')
+    if dry_run is None:
+        return await run_enforcement(bot)
+    return await run_enforcement(bot, dry_run=dry_run)
+
+JOB_HANDLERS = {
+    'sync': run_sync_job,
+    'reminders': run_reminders_job,
+    'sheet_export': run_sheet_export_job,
+    'enforcement': run_enforcement_job
+}
+
+async def run_worker(worker_id) -> None:
+    """Poll the job table until a stop signal arrives."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with AsyncExitStack() as stack:
+        # One bot per tenant. Worker sends are bulk traffic; the queue keeps them within the bot rate limits
+        bots = {}
+        for tenant in get_tenants():
+            bots[tenant.id] = await stack.enter_async_context(ExtBot(tenant.bot_token, rate_limiter=PriorityRateLimiter()))
+        
+        logger.info(f"Worker {worker_id} started, handling: {', '.join(JOB_HANDLERS)}")
+        while not stop_event.is_set():
+            job = claim_next_job(worker_id, list(JOB_HANDLERS))
+            if not job:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"Running {job['kind']} job {job['id']} for tenant {job['tenant_id']} (attempt {job['attempts']})")
+            try:
+                with tenant_scope(get_tenant(job['tenant_id'])):
+                    result = await JOB_HANDLERS[job['kind']](bots[job['tenant_id']], job['payload'])
+                complete_job(job['id'], result)
+                logger.info(f"Job {job['id']} done")
+            except Exception as e:
+                logger.error(f"Job {job['id']} failed: {e}")
+                logger.error(traceback.format_exc())
+                fail_job(job['id'], e)
+
+    logger.info(f"Worker {worker_id} stopped")
+
+def main() -> None:
+    """Start the worker."""
+    if any(tenant.bot_token == "your_telegram_bot_token" for tenant in get_tenants()):
+        logger.error("Please set your bot token in config.py or .env file")
+        sys.exit(1)
+
+    if AUTO_MIGRATE:
+        init_db()
+    
+    # DB and sync metrics of the jobs run here
+    instrument_engine(engine)
+    if WORKER_METRICS_PORT:
+        start_metrics_server(WORKER_METRICS_PORT, METRICS_HOST)
+    
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    asyncio.run(run_worker(worker_id))
+
+if __name__ == "__main__":
+    main()